@@ -1,7 +1,13 @@
+import hashlib
+import json
 import os
-import firebase_admin
-from firebase_admin import credentials, firestore
+import threading
+from dataclasses import dataclass
+from datetime import date
+from typing import Optional
 from dotenv import load_dotenv
+from app.spans import span
+from app.storage import SERVER_TIMESTAMP, STORAGE_BACKEND, open_storage
 
 load_dotenv()
 
@@ -13,14 +19,228 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 # Ensure your file in the folder is named "service_account.json" (underscore)
 KEY_PATH = os.path.join(BASE_DIR, "service_account.json")
 
-if not firebase_admin._apps:
-    if os.path.exists(KEY_PATH):
-        cred = credentials.Certificate(KEY_PATH)
-        firebase_admin.initialize_app(cred)
-        print(f"✅ Firebase initialized using key at: {KEY_PATH}")
-    else:
-        print(f"⚠️ Key not found at: {KEY_PATH}")
-        print("   Attempting to use Default Credentials (Production Mode)...")
-        firebase_admin.initialize_app()
-
-db = firestore.client()
\ No newline at end of file
+
+def _firestore_client():
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+    if not firebase_admin._apps:
+        if os.path.exists(KEY_PATH):
+            cred = credentials.Certificate(KEY_PATH)
+            firebase_admin.initialize_app(cred)
+            print(f"✅ Firebase initialized using key at: {KEY_PATH}")
+        else:
+            print(f"⚠️ Key not found at: {KEY_PATH}")
+            print("   Attempting to use Default Credentials (Production Mode)...")
+            firebase_admin.initialize_app()
+    return firestore.client()
+
+
+# 3. Clients are created on first use, so importing a task never touches the network
+_db = None
+_storage = None
+_clients_lock = threading.RLock()
+
+
+def get_firestore():
+    """The raw Firestore client (the Firestore ledger and shard leases need transactions)."""
+    global _db
+    with _clients_lock:
+        if _db is None:
+            _db = _firestore_client()
+        return _db
+
+
+def get_storage():
+    """Storage for the configured backend (KSJ_STORAGE)."""
+    global _storage
+    with _clients_lock:
+        if _storage is None:
+            client = get_firestore() if STORAGE_BACKEND == "firestore" else None
+            _storage = open_storage(firestore_client=client)
+        return _storage
+
+
+# --- Edition snapshot -------------------------------------------------------
+
+# Section key -> (collection, document) for everything that makes up one edition.
+# The per-section documents are still written for older readers; the frontend and
+# load_edition() read the consolidated CURRENT_EDITION document instead.
+EDITION_DOCS = {
+    "ticker": ("system", "market_ticker"),
+    "whats_news": ("daily_edition", "whats_news"),
+    "hero": ("daily_edition", "hero_story"),
+    "featured": ("daily_edition", "featured_stories"),
+    "opinions": ("daily_edition", "opinions"),
+    "deep_dive": ("daily_edition", "deep_dive"),
+    "global_briefing": ("daily_edition", "global_briefing"),
+    "campus": ("daily_edition", "campus_news"),
+}
+
+# editions/<YYYY-MM-DD> keeps every published version; CURRENT_EDITION mirrors the latest
+EDITIONS_COLLECTION = "editions"
+CURRENT_EDITION = ("system", "current_edition")
+
+
+@dataclass
+class Edition:
+    """One consistent read of every section document (None where a document is missing)."""
+    ticker: Optional[dict] = None
+    whats_news: Optional[dict] = None
+    hero: Optional[dict] = None
+    featured: Optional[dict] = None
+    opinions: Optional[dict] = None
+    deep_dive: Optional[dict] = None
+    global_briefing: Optional[dict] = None
+    campus: Optional[dict] = None
+
+    def items(self, section: str) -> list:
+        """The section's "items" list, or [] if the section is missing."""
+        return (getattr(self, section) or {}).get("items") or []
+
+    def last_updated(self, section: str):
+        return (getattr(self, section) or {}).get("lastUpdated")
+
+
+def load_edition() -> Edition:
+    """Read the consolidated current edition (one document).
+
+    Sections it doesn't have yet (nothing published, or only some sections published
+    since it was introduced) come from one batched read of their per-section documents.
+    """
+    current = "/".join(CURRENT_EDITION)
+    with span("db.read", doc=current):
+        sections = dict((get_storage().get(current) or {}).get("sections") or {})
+
+    missing = {key: "/".join(doc) for key, doc in EDITION_DOCS.items() if not sections.get(key)}
+    if missing:
+        with span("db.read", docs=len(missing)):
+            docs = get_storage().get_many(list(missing.values()))
+        sections.update({key: docs[path] for key, path in missing.items()})
+    return Edition(**{key: sections.get(key) for key in EDITION_DOCS})
+
+
+# --- Edition publishing -----------------------------------------------------
+
+_staged = None  # section key -> data while a pipeline run is staging, else None
+_staging_closed = False
+_rejected = set()  # sections whose task timed out this run: whatever they stage is dropped
+_staged_lock = threading.Lock()
+
+
+def begin_edition():
+    """Start staging: publish_section() holds outputs until commit_edition()."""
+    global _staged, _staging_closed, _previous
+    with _staged_lock:
+        _staged = {}
+        _staging_closed = False
+        _rejected.clear()
+    with _previous_lock:
+        _previous = None
+
+
+def publish_section(section: str, data: dict):
+    """Publish one section's output.
+
+    Inside a pipeline run the data is staged and goes out with the rest of the edition;
+    a task run on its own commits its section straight away.
+    """
+    if section not in EDITION_DOCS:
+        raise KeyError(f"Unknown edition section: {section}")
+    with _staged_lock:
+        if _staging_closed:
+            print(f"   ⚠️ Edition already published, dropping late '{section}' output")
+            return
+        if _staged is not None:
+            if section in _rejected:
+                print(f"   ⚠️ Task timed out, dropping late '{section}' output")
+                return
+            _staged[section] = data
+            return
+    _write_edition({section: data})
+
+
+def reject_section(section: str):
+    """Keep a section out of the staged edition: its task timed out but its thread may still publish."""
+    with _staged_lock:
+        _rejected.add(section)
+        if _staged:
+            _staged.pop(section, None)
+
+
+def commit_edition(edition_id: str = None):
+    """Commit everything staged so far (except rejected sections) in one batch and stop staging.
+
+    Returns the edition ID, or None if nothing was staged.
+    """
+    global _staged, _staging_closed
+    with _staged_lock:
+        sections = {key: data for key, data in (_staged or {}).items() if key not in _rejected}
+        _staged, _staging_closed = None, True
+    if not sections:
+        return None
+    return _write_edition(sections, edition_id)
+
+
+def _write_edition(sections: dict, edition_id: str = None):
+    """One atomic batched write: section documents, the dated edition and the current pointer.
+
+    Sections not in this publish keep their previous value (merge on field paths only
+    replaces the sections being written), so a partial run never blanks the others.
+    """
+    edition_id = edition_id or date.today().isoformat()
+    writes = [("/".join(EDITION_DOCS[key]), data, None) for key, data in sections.items()]
+
+    payload = {
+        "editionId": edition_id,
+        "publishedAt": SERVER_TIMESTAMP,
+        "sections": sections,
+    }
+    fields = ["editionId", "publishedAt"] + [f"sections.{key}" for key in sections]
+    writes.append((f"{EDITIONS_COLLECTION}/{edition_id}", payload, fields))
+    writes.append(("/".join(CURRENT_EDITION), payload, fields))
+    with span("db.write", edition=edition_id, sections=len(sections), docs=len(writes)):
+        get_storage().write(writes)
+    print(f"📰 Edition {edition_id} published: {', '.join(sections)}")
+    return edition_id
+
+
+# --- Input fingerprints -----------------------------------------------------
+
+# Stored in each generated section next to its content. When a task's inputs (feed
+# entries, market snapshot) hash to the same value as last time, the previous output
+# is republished with a fresh lastUpdated instead of calling the model again.
+FINGERPRINT_FIELD = "inputFingerprint"
+FORCE_REGENERATE = os.getenv("KSJ_FORCE_REGENERATE", "").lower() in ("1", "on", "true")
+
+_previous = None  # last published Edition, read once per run
+_previous_lock = threading.Lock()
+
+
+def fingerprint(inputs) -> str:
+    """Stable digest of a section's normalized inputs (anything JSON-serializable)."""
+    payload = json.dumps(inputs, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+
+def _previous_section(section):
+    global _previous
+    with _previous_lock:
+        if _previous is None:
+            _previous = load_edition()
+        return getattr(_previous, section)
+
+
+def reuse_if_unchanged(section: str, inputs_fingerprint: str) -> bool:
+    """Republish the section's last output if it was generated from the same inputs.
+
+    Only lastUpdated changes, which keeps the newsletter freshness check passing.
+    Returns False (generate as usual) when the inputs differ or KSJ_FORCE_REGENERATE is set.
+    """
+    if FORCE_REGENERATE:
+        return False
+    previous = _previous_section(section)
+    if not previous or previous.get(FINGERPRINT_FIELD) != inputs_fingerprint:
+        return False
+    publish_section(section, {**previous, "lastUpdated": SERVER_TIMESTAMP})
+    print(f"   ♻️ Inputs unchanged since the last edition, reused '{section}' (lastUpdated refreshed)")
+    return True
@@ -0,0 +1,94 @@
+"""
+Near-duplicate clustering for feed entries.
+The same story usually appears in several feeds (Financial Post, CBC, BBC, CNBC).
+Entries are compared by TF-IDF cosine similarity of their title (weighted double) and
+summary; entries above KSJ_DEDUPE_THRESHOLD are linked and each connected group is
+one cluster. Only a representative per cluster goes into the prompt, with the cluster
+size as a signal of how widely the story is covered.
+"""
+import os
+import re
+
+import numpy as np
+
+DEDUPE_THRESHOLD = float(os.getenv("KSJ_DEDUPE_THRESHOLD", "0.45"))
+SUMMARY_CHARS = 300
+
+STOPWORDS = frozenset("""
+a about after again against all also an and any are as at be been before being but by can could did do
+does for from had has have he her his how i if in into is it its just more most new no not of on or our
+out over says said she so than that the their them then there these they this to up was we were what
+when where which while who will with would you your
+""".split())
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?")
+_TAGS = re.compile(r"<[^>]+>")
+
+
+def _tokens(text):
+    words = _TOKEN.findall(_TAGS.sub(" ", text or "").lower())
+    # Crude plural folding so "tariff" and "tariffs" match
+    return [w[:-1] if len(w) > 4 and w.endswith("s") else w for w in words if w not in STOPWORDS]
+
+
+def similarity_matrix(texts: list) -> np.ndarray:
+    """Pairwise TF-IDF cosine similarity (n x n)."""
+    docs = [_tokens(text) for text in texts]
+    vocab = {}
+    for doc in docs:
+        for word in doc:
+            vocab.setdefault(word, len(vocab))
+    counts = np.zeros((len(docs), max(len(vocab), 1)))
+    for row, doc in enumerate(docs):
+        for word in doc:
+            counts[row, vocab[word]] += 1
+    df = (counts > 0).sum(axis=0)
+    tfidf = np.log1p(counts) * (np.log((1 + len(docs)) / (1 + df)) + 1)
+    norms = np.linalg.norm(tfidf, axis=1, keepdims=True)
+    tfidf /= np.where(norms == 0, 1, norms)
+    return tfidf @ tfidf.T
+
+
+def cluster(texts: list, threshold: float = DEDUPE_THRESHOLD) -> list:
+    """Group near-duplicate texts. Returns lists of indices, each in input order, ordered by first member."""
+    n = len(texts)
+    if n < 2:
+        return [[i] for i in range(n)]
+    linked = similarity_matrix(texts) >= threshold
+    parent = list(range(n))
+
+    def root(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, j in zip(*np.nonzero(np.triu(linked, k=1))):
+        ri, rj = root(i), root(j)
+        if ri != rj:
+            parent[max(ri, rj)] = min(ri, rj)
+    groups = {}
+    for i in range(n):
+        groups.setdefault(root(i), []).append(i)
+    return sorted(groups.values(), key=lambda members: members[0])
+
+
+def entry_text(entry) -> str:
+    """Title (counted twice) plus the start of the summary, for feed entries."""
+    title = entry.get("title") or ""
+    return f"{title} {title} {(entry.get('summary') or '')[:SUMMARY_CHARS]}"
+
+
+def dedupe(items: list, text=entry_text, threshold: float = DEDUPE_THRESHOLD) -> list:
+    """One (representative, cluster size) per cluster, in input order.
+
+    The representative is the first member, so feed order decides which outlet's
+    version is kept.
+    """
+    clusters = cluster([text(item) for item in items], threshold)
+    return [(items[members[0]], len(members)) for members in clusters]
+
+
+def coverage_note(size: int) -> str:
+    """Suffix for a prompt line: ' (covered by 3 outlets)' or ''."""
+    return f" (covered by {size} outlets)" if size > 1 else ""
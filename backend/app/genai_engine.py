@@ -1,38 +1,572 @@
 import os
+import re
 import json
-import google.generativeai as genai
+import time
+import random
+import hashlib
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from dotenv import load_dotenv
+from app.ratelimit import RateLimiter
+from app.spans import bind, span
 
 load_dotenv()
 
 GEN_KEY = os.getenv("GEMINI_API_KEY")
-if not GEN_KEY:
-    raise ValueError("GEMINI_API_KEY not found in environment")
+MODEL_NAME = "gemini-flash-latest"
 
-genai.configure(api_key=GEN_KEY)
+# Built on first use: importing the SDK is slow and tasks that never call the model
+# (ticker, newsletter) shouldn't need a key
+model = None
+_model_lock = threading.Lock()
+
+JSON_CONFIG = {"response_mime_type": "application/json"}
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Response cache keyed by hash(model, generation config, prompt)
+CACHE_DIR = os.getenv("KSJ_GENAI_CACHE_DIR", os.path.join(BASE_DIR, ".cache", "genai"))
+CACHE_TTL = int(os.getenv("KSJ_GENAI_CACHE_TTL", str(12 * 3600)))
+CACHE_MAX_BYTES = int(os.getenv("KSJ_GENAI_CACHE_MB", "50")) * 1024 * 1024
+CACHE_ENABLED = os.getenv("KSJ_GENAI_CACHE", "on").lower() not in ("0", "off", "false")
+
+# Shared quota across every section running in this process
+RPM_LIMIT = int(os.getenv("KSJ_GEMINI_RPM", "60"))
+TPM_LIMIT = int(os.getenv("KSJ_GEMINI_TPM", "1000000"))
+MAX_CONCURRENCY = int(os.getenv("KSJ_GEMINI_CONCURRENCY", "4"))
+
+# Deadlines, retries and hedging for the long latency tail
+CALL_DEADLINE = float(os.getenv("KSJ_GEMINI_DEADLINE", "90"))  # stays under the pipeline's 120s task timeout
+MAX_RETRIES = 3
+RETRY_BASE_DELAY = 1.0
+HEDGE_ENABLED = os.getenv("KSJ_GEMINI_HEDGE", "on").lower() not in ("0", "off", "false")
+HEDGE_PERCENTILE = 0.9
+HEDGE_MIN_SAMPLES = 10
+LATENCY_PATH = os.getenv("KSJ_GENAI_LATENCY", os.path.join(BASE_DIR, ".cache", "genai_latency.json"))
+# Token budget for the candidate block of each section's prompt; KSJ_PROMPT_BUDGET_<SECTION> overrides one
+PROMPT_BUDGETS = {
+    "whats_news": 400,
+    "hero": 400,
+    "featured": 900,
+    "opinions": 300,
+    "global_briefing": 700,
+    "campus": 700,
+}
+DEFAULT_PROMPT_BUDGET = int(os.getenv("KSJ_PROMPT_BUDGET", "800"))
+TRANSIENT_ERRORS = {
+    "ResourceExhausted", "TooManyRequests", "ServiceUnavailable",
+    "InternalServerError", "DeadlineExceeded", "GatewayTimeout",
+}
+
+_stats = {"hits": 0, "misses": 0}
+_stats_lock = threading.Lock()
+
+
+def _get_model():
+    """The shared GenerativeModel, configured on first call."""
+    global model
+    with _model_lock:
+        if model is None:
+            if not GEN_KEY:
+                raise ValueError("GEMINI_API_KEY not found in environment")
+            import google.generativeai as genai
+            genai.configure(api_key=GEN_KEY)
+            model = genai.GenerativeModel(MODEL_NAME)
+        return model
+
+
+def _cache_key(prompt, generation_config):
+    payload = json.dumps([MODEL_NAME, generation_config or {}, prompt], sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _cache_path(key):
+    return os.path.join(CACHE_DIR, f"{key}.json")
+
+
+def _cache_get(key):
+    path = _cache_path(key)
+    try:
+        with open(path) as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if time.time() - entry.get("created", 0) > CACHE_TTL:
+        return None
+    os.utime(path)  # Eviction drops least recently used entries first
+    return entry.get("text")
+
+
+def _evict():
+    """Drop expired entries, then the least recently used ones until under the size cap."""
+    try:
+        files = [os.path.join(CACHE_DIR, name) for name in os.listdir(CACHE_DIR) if name.endswith(".json")]
+        entries = sorted((os.stat(p).st_mtime, os.stat(p).st_size, p) for p in files)
+    except OSError:
+        return
+    now = time.time()
+    total = sum(size for _, size, _ in entries)
+    for mtime, size, path in entries:
+        if total <= CACHE_MAX_BYTES and now - mtime <= CACHE_TTL:
+            continue
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+
+def _cache_put(key, text):
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp = f"{_cache_path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"created": time.time(), "model": MODEL_NAME, "text": text}, f)
+        os.replace(tmp, _cache_path(key))
+        _evict()
+    except Exception as e:
+        print(f"   ⚠️ Could not write AI cache: {e}")
+
+
+def _count(field):
+    with _stats_lock:
+        _stats[field] += 1
+
+
+def cache_stats():
+    """Hit/miss counters for the response cache in this process."""
+    with _stats_lock:
+        return dict(_stats)
+
+
+_limiter = RateLimiter(requests=RPM_LIMIT, tokens=TPM_LIMIT)
+
+
+class LatencyHistogram:
+    """Log-spaced latency buckets (0.25s .. 256s) with exponential aging.
+
+    Counts are halved once they pass MAX_COUNT so the percentiles follow recent runs.
+    """
+
+    BOUNDS = [0.25 * 2 ** i for i in range(11)]
+    MAX_COUNT = 500
+
+    def __init__(self, counts=None):
+        self.counts = counts or [0] * (len(self.BOUNDS) + 1)
+
+    def record(self, seconds):
+        i = next((i for i, bound in enumerate(self.BOUNDS) if seconds <= bound), len(self.BOUNDS))
+        self.counts[i] += 1
+        if sum(self.counts) > self.MAX_COUNT:
+            self.counts = [c // 2 for c in self.counts]
+
+    def total(self):
+        return sum(self.counts)
+
+    def percentile(self, q):
+        """Upper bound of the bucket holding the q-th quantile, or None if empty."""
+        total = self.total()
+        if not total:
+            return None
+        running = 0
+        for i, count in enumerate(self.counts):
+            running += count
+            if running >= q * total:
+                return self.BOUNDS[min(i, len(self.BOUNDS) - 1)]
+        return self.BOUNDS[-1]
+
+
+def _load_latency():
+    try:
+        with open(LATENCY_PATH) as f:
+            return {kind: LatencyHistogram(counts) for kind, counts in json.load(f).items()}
+    except (OSError, ValueError, TypeError):
+        return {}
+
+
+_latency = _load_latency()
+_latency_lock = threading.Lock()
+
+
+def _record_latency(kind, seconds):
+    with _latency_lock:
+        _latency.setdefault(kind, LatencyHistogram()).record(seconds)
+        try:
+            os.makedirs(os.path.dirname(LATENCY_PATH), exist_ok=True)
+            tmp = f"{LATENCY_PATH}.{os.getpid()}.tmp"
+            with open(tmp, "w") as f:
+                json.dump({k: h.counts for k, h in _latency.items()}, f)
+            os.replace(tmp, LATENCY_PATH)
+        except OSError:
+            pass
+
+
+def latency_stats():
+    """p50/p90/p99 per call kind, from the persisted histograms."""
+    with _latency_lock:
+        return {
+            kind: {"count": h.total(), "p50": h.percentile(0.5), "p90": h.percentile(0.9), "p99": h.percentile(0.99)}
+            for kind, h in _latency.items()
+        }
+
+
+def _hedge_threshold(kind):
+    if not HEDGE_ENABLED:
+        return None
+    with _latency_lock:
+        hist = _latency.get(kind)
+        if not hist or hist.total() < HEDGE_MIN_SAMPLES:
+            return None
+        return hist.percentile(HEDGE_PERCENTILE)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) for quota accounting."""
+    return len(text) // 4 + 1
+
+
+_TAGS = re.compile(r"<[^>]+>")
 
-MODEL_NAME = "gemini-flash-latest"
-model = genai.GenerativeModel(MODEL_NAME)
 
+def clip_tokens(text: str, max_tokens: int) -> str:
+    """Text without HTML tags or runs of whitespace, cut at a word boundary to about max_tokens."""
+    text = " ".join(_TAGS.sub(" ", text or "").split())
+    max_chars = max_tokens * 4
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars].rsplit(" ", 1)[0] + "…"
 
-def generate_json(prompt: str):
+
+def prompt_budget(section: str) -> int:
+    override = os.getenv(f"KSJ_PROMPT_BUDGET_{section.upper()}")
+    return int(override) if override else PROMPT_BUDGETS.get(section, DEFAULT_PROMPT_BUDGET)
+
+
+def pack_candidates(section: str, candidates: list, render, separator: str = "\n", budget: int = None):
+    """Render candidates, best first, into one prompt block within the section's token budget.
+
+    Stops at the first candidate that doesn't fit (the first one is always kept).
+    Returns (text, packed candidates) and logs the tokens used against the budget.
+    """
+    budget = budget or prompt_budget(section)
+    lines, packed, used = [], [], 0
+    for candidate in candidates:
+        line = render(candidate)
+        tokens = estimate_tokens(line + separator)
+        if packed and used + tokens > budget:
+            break
+        lines.append(line)
+        packed.append(candidate)
+        used += tokens
+    print(f"   📏 {section}: {used}/{budget} prompt tokens for {len(packed)}/{len(candidates)} candidates")
+    return separator.join(lines), packed
+
+
+def candidate_index(item, count: int, key: str = "id"):
+    """The candidate id the model echoed back in item[key] (int or numeric string), or None if invalid."""
+    try:
+        index = int(item.get(key))
+    except (AttributeError, TypeError, ValueError):
+        return None
+    return index if 0 <= index < count else None
+
+
+_hedge_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="gemini")
+
+
+def _call_kind(generation_config):
+    return (generation_config or {}).get("response_mime_type", "text/plain")
+
+
+def _call_model(prompt, generation_config, timeout):
+    """One rate-limited request; its latency feeds the hedging histogram."""
+    _limiter.acquire(requests=1, tokens=estimate_tokens(prompt))
+    kwargs = {"request_options": {"timeout": max(timeout, 1.0)}}
+    if generation_config:
+        kwargs["generation_config"] = generation_config
+    start = time.monotonic()
+    with span("llm.call", kind=_call_kind(generation_config)) as attrs:
+        response = _get_model().generate_content(prompt, **kwargs)
+        text = response.text
+        attrs["response_chars"] = len(text or "")
+    _record_latency(_call_kind(generation_config), time.monotonic() - start)
+    _limiter.record(tokens=estimate_tokens(text or ""))
+    return text
+
+
+def _call_hedged(prompt, generation_config, deadline_at):
+    """Send the request; if it outlives the latency percentile, send a second and take the first back."""
+    remaining = deadline_at - time.monotonic()
+    first = _hedge_pool.submit(bind(_call_model), prompt, generation_config, remaining)
+    threshold = _hedge_threshold(_call_kind(generation_config))
+    if threshold is None or threshold >= remaining:
+        return first.result(timeout=remaining)
+
+    done, _ = wait([first], timeout=threshold)
+    if done:
+        return first.result()
+    print(f"   ⏱️ AI call slower than p{int(HEDGE_PERCENTILE * 100)} ({threshold:.1f}s) — sending hedged request")
+    second = _hedge_pool.submit(bind(_call_model), prompt, generation_config, deadline_at - time.monotonic())
+
+    pending = {first, second}
+    error = None
+    while pending:
+        done, pending = wait(pending, timeout=max(0.0, deadline_at - time.monotonic()), return_when=FIRST_COMPLETED)
+        if not done:
+            raise TimeoutError("AI call exceeded its deadline")
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+            error = future.exception()
+    raise error
+
+
+def _is_transient(error):
+    return type(error).__name__ in TRANSIENT_ERRORS or isinstance(error, (ConnectionError, TimeoutError))
+
+
+def _retry_delay(attempt, error, deadline_at):
+    """Backoff before retry number `attempt`, or None if the error shouldn't be retried."""
+    delay = RETRY_BASE_DELAY * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+    if attempt > MAX_RETRIES or not _is_transient(error) or time.monotonic() + delay >= deadline_at:
+        return None
+    return delay
+
+
+def _call_with_retries(prompt, generation_config, deadline):
+    """Retry transient errors with exponential backoff, never sleeping past the deadline."""
+    deadline_at = time.monotonic() + deadline
+    attempt = 0
+    while True:
+        try:
+            return _call_hedged(prompt, generation_config, deadline_at)
+        except Exception as e:
+            attempt += 1
+            delay = _retry_delay(attempt, e, deadline_at)
+            if delay is None:
+                raise
+            print(f"   ⚠️ AI call failed ({type(e).__name__}), retry {attempt}/{MAX_RETRIES} in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def generate(prompt: str, generation_config=None, use_cache=True, deadline=None):
+    """Call the model and return the raw response text, using the response cache.
+
+    Raises on API errors or once `deadline` seconds (default CALL_DEADLINE) have passed.
+    JSON-mode responses are only cached once they parse, so a malformed response is
+    never replayed.
+    """
+    with span("llm.generate", kind=_call_kind(generation_config), prompt_chars=len(prompt),
+              prompt_tokens=estimate_tokens(prompt)) as attrs:
+        text = _generate(prompt, generation_config, use_cache, deadline, attrs)
+        attrs["response_chars"] = len(text or "")
+    return text
+
+
+def _generate(prompt, generation_config, use_cache, deadline, attrs):
+    use_cache = use_cache and CACHE_ENABLED
+    key = _cache_key(prompt, generation_config)
+    if use_cache:
+        text = _cache_get(key)
+        if text is not None:
+            _count("hits")
+            attrs["cache"] = "hit"
+            return text
+        _count("misses")
+    attrs["cache"] = "miss" if use_cache else "off"
+
+    text = _call_with_retries(prompt, generation_config, deadline or CALL_DEADLINE)
+
+    if use_cache and text:
+        try:
+            if generation_config and generation_config.get("response_mime_type") == "application/json":
+                json.loads(text)
+            _cache_put(key, text)
+        except ValueError:
+            pass
+    return text
+
+
+def generate_json(prompt: str, use_cache=True, deadline=None):
     """Generate content with JSON response mode. Returns parsed dict/list or None."""
     try:
-        response = model.generate_content(
-            prompt,
-            generation_config={"response_mime_type": "application/json"}
-        )
-        return json.loads(response.text)
+        return json.loads(generate(prompt, JSON_CONFIG, use_cache=use_cache, deadline=deadline))
     except Exception as e:
         print(f"   ❌ AI JSON Error: {e}")
         return None
 
 
-def generate_text(prompt: str):
+def generate_text(prompt: str, use_cache=True, deadline=None):
     """Generate content as plain text. Returns cleaned string or None."""
     try:
-        response = model.generate_content(prompt)
-        return response.text.replace("*", "").strip()
+        return generate(prompt, use_cache=use_cache, deadline=deadline).replace("*", "").strip()
     except Exception as e:
         print(f"   ❌ AI Text Error: {e}")
         return None
+
+
+def generate_many(prompts: list, generation_config=None, use_cache=True, deadline=None,
+                  max_workers=MAX_CONCURRENCY):
+    """Run many prompts concurrently under the shared rate limiter.
+
+    Returns a list of (text, error) tuples in the same order as prompts; exactly one of
+    the two is None for each prompt.
+    """
+    def run(prompt):
+        try:
+            return generate(prompt, generation_config, use_cache=use_cache, deadline=deadline), None
+        except Exception as e:
+            return None, e
+
+    if not prompts:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(prompts))) as pool:
+        return list(pool.map(bind(run), prompts))
+
+
+class JsonArrayStream:
+    """Incremental parser that yields elements of a JSON array as their text completes.
+
+    Handles a top-level array (`[{...}, {...}]`) or the first array inside a top-level
+    object (`{"items": [...]}`). Strings and escapes are tracked so brackets inside
+    text don't confuse it.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.items = []
+        self._stack = []
+        self._in_string = False
+        self._escaped = False
+        self._array_depth = None
+        self._array_closed = False
+        self._item_start = None
+
+    def _emit(self, end, new):
+        if self._item_start is None:
+            return
+        raw = self.text[self._item_start:end]
+        self._item_start = None
+        try:
+            item = json.loads(raw)
+        except ValueError:
+            return
+        self.items.append(item)
+        new.append(item)
+
+    def feed(self, chunk):
+        """Consume a chunk of text; returns the items completed by it."""
+        new = []
+        start = len(self.text)
+        self.text += chunk
+        for i in range(start, len(self.text)):
+            c = self.text[i]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif c == "\\":
+                    self._escaped = True
+                elif c == '"':
+                    self._in_string = False
+                continue
+
+            at_level = self._array_depth is not None and len(self._stack) == self._array_depth
+            if at_level and self._item_start is None and not c.isspace() and c not in ",]":
+                self._item_start = i
+
+            if c == '"':
+                self._in_string = True
+            elif c in "[{":
+                self._stack.append(c)
+                if c == "[" and self._array_depth is None and not self._array_closed and len(self._stack) <= 2:
+                    self._array_depth = len(self._stack)
+            elif c in "]}":
+                if at_level and c == "]":
+                    self._emit(i, new)
+                    self._array_depth = None
+                    self._array_closed = True
+                if self._stack:
+                    self._stack.pop()
+            elif c == "," and at_level:
+                self._emit(i, new)
+        return new
+
+
+def stream_json_items(prompt: str, on_item=None, use_cache=True, deadline=None):
+    """Stream a JSON-array response, handing each element to on_item(item, index) as it completes.
+
+    Transient errors are retried with backoff (like generate()) until the first item
+    has been handed out. After that, if the stream breaks or runs past the deadline,
+    the items already parsed are kept instead of discarding the whole response.
+    """
+    with span("llm.stream", prompt_chars=len(prompt), prompt_tokens=estimate_tokens(prompt)) as attrs:
+        items = _stream_json_items(prompt, on_item, use_cache, deadline, attrs)
+        attrs["items"] = len(items)
+    return items
+
+
+def _stream_json_items(prompt, on_item, use_cache, deadline, attrs):
+    parser = JsonArrayStream()
+
+    def deliver(items):
+        first = len(parser.items) - len(items)
+        for offset, item in enumerate(items):
+            if on_item:
+                on_item(item, first + offset)
+
+    use_cache = use_cache and CACHE_ENABLED
+    key = _cache_key(prompt, JSON_CONFIG)
+    if use_cache:
+        text = _cache_get(key)
+        if text is not None:
+            _count("hits")
+            attrs["cache"] = "hit"
+            deliver(parser.feed(text))
+            return parser.items
+        _count("misses")
+    attrs["cache"] = "miss" if use_cache else "off"
+
+    deadline_at = time.monotonic() + (deadline or CALL_DEADLINE)
+    attempt = 0
+    while True:
+        error = None
+        _limiter.acquire(requests=1, tokens=estimate_tokens(prompt))
+        start = time.monotonic()
+        try:
+            response = _get_model().generate_content(
+                prompt,
+                generation_config=JSON_CONFIG,
+                stream=True,
+                request_options={"timeout": max(0.1, deadline_at - start)},
+            )
+            for chunk in response:
+                deliver(parser.feed(chunk.text))
+                if time.monotonic() > deadline_at:
+                    raise TimeoutError("AI stream exceeded its deadline")
+        except Exception as e:
+            error = e
+        _limiter.record(tokens=estimate_tokens(parser.text))
+        # Once items have gone to on_item the stream can't be restarted without repeating them
+        if error is None or parser.items:
+            break
+        attempt += 1
+        delay = _retry_delay(attempt, error, deadline_at)
+        if delay is None:
+            break
+        print(f"   ⚠️ AI stream failed ({type(error).__name__}), retry {attempt}/{MAX_RETRIES} in {delay:.1f}s")
+        time.sleep(delay)
+        parser = JsonArrayStream()  # whatever partial text arrived is discarded
+
+    complete = error is None
+    if error:
+        print(f"   ⚠️ AI stream interrupted after {len(parser.items)} item(s): {error}")
+    attrs.update(response_chars=len(parser.text), complete=complete, attempts=attempt + 1)
+    if complete:
+        _record_latency("application/json", time.monotonic() - start)
+        if use_cache:
+            try:
+                json.loads(parser.text)
+                _cache_put(key, parser.text)
+            except ValueError:
+                pass
+    return parser.items
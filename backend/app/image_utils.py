@@ -1,7 +1,20 @@
 import hashlib
-import requests
-from bs4 import BeautifulSoup
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from app.genai_engine import generate_json
+from app.spans import bind, span
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Persistent validation cache: url -> [status, content-type, checked_at]
+IMAGE_CACHE_PATH = os.getenv("KSJ_IMAGE_CACHE", os.path.join(BASE_DIR, ".cache", "images.json"))
+IMAGE_TTL_OK = 7 * 24 * 3600     # a working image is re-checked weekly
+IMAGE_TTL_FAILED = 6 * 3600      # a dead URL gets another chance after 6 hours
+IMAGE_TIMEOUT = 5
+IMAGE_WORKERS = 8
 
 # Curated, verified Unsplash photos by category (all confirmed 200 OK)
 STOCK_IMAGES = {
@@ -64,6 +77,7 @@ def _extract_best_img_from_html(html):
     """Extract the best image from HTML content. Prefers <figure> featured images."""
     if not html:
         return None
+    from bs4 import BeautifulSoup
     soup = BeautifulSoup(html, "html.parser")
     # 1. Prefer image inside a <figure> (typically the featured/primary image)
     figure = soup.find("figure")
@@ -116,28 +130,150 @@ def get_image_from_entry(entry):
     return None
 
 
+_session = None
+_session_lock = threading.Lock()
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def _get_session():
+    """Shared pooled session so repeated checks against a CDN reuse connections."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=IMAGE_WORKERS, pool_maxsize=IMAGE_WORKERS)
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+        return _session
+
+
+def _load_cache():
+    global _cache
+    if _cache is None:
+        try:
+            with open(IMAGE_CACHE_PATH) as f:
+                _cache = json.load(f)
+        except (OSError, ValueError):
+            _cache = {}
+    return _cache
+
+
+def _save_cache():
+    """Write the cache (caller holds _cache_lock), dropping entries past their TTL so the file stays bounded."""
+    now = time.time()
+    for url in [url for url, entry in _cache.items() if _expired(entry, now)]:
+        del _cache[url]
+    try:
+        os.makedirs(os.path.dirname(IMAGE_CACHE_PATH), exist_ok=True)
+        tmp = f"{IMAGE_CACHE_PATH}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(_cache, f)
+        os.replace(tmp, IMAGE_CACHE_PATH)
+    except Exception as e:
+        print(f"         ⚠️ Could not write image cache: {e}")
+
+
+def _is_image(status, content_type):
+    return status in (200, 206) and ("image" in content_type or "octet-stream" in content_type)
+
+
+def _cached_result(url):
+    """Cached validation result for url, or None if never checked or expired."""
+    with _cache_lock:
+        hit = _load_cache().get(url)
+    if not hit:
+        return None
+    return None if _expired(hit, time.time()) else _is_image(hit[0], hit[1])
+
+
+def _expired(entry, now):
+    status, content_type, checked_at = entry
+    ttl = IMAGE_TTL_OK if _is_image(status, content_type) else IMAGE_TTL_FAILED
+    return now - checked_at >= ttl
+
+
+def _check_image(url):
+    """HEAD the URL; fall back to a one-byte ranged GET for servers that reject HEAD."""
+    with span("image.check", url=url) as attrs:
+        result = _head_or_range_get(url)
+        attrs["status"] = result[0]
+    return result
+
+
+def _head_or_range_get(url):
+    import requests
+    session = _get_session()
+    try:
+        resp = session.head(url, timeout=IMAGE_TIMEOUT, allow_redirects=True)
+        if resp.status_code not in (403, 405, 501):
+            return resp.status_code, resp.headers.get("content-type", "")
+    except requests.RequestException:
+        pass
+    try:
+        with session.get(url, headers={"Range": "bytes=0-0"}, timeout=IMAGE_TIMEOUT,
+                         allow_redirects=True, stream=True) as resp:
+            return resp.status_code, resp.headers.get("content-type", "")
+    except requests.RequestException:
+        return 0, ""
+
+
+def _is_checkable(url):
+    return bool(url) and url.startswith(("http://", "https://"))
+
+
+def validate_image_urls(urls):
+    """Validate many image URLs at once. Returns {url: bool}.
+
+    Cached results are reused; the rest are checked in parallel over the pooled session.
+    """
+    with span("image.validate", urls=len(urls)) as attrs:
+        results = _validate(urls, attrs)
+    return results
+
+
+def _validate(urls, attrs):
+    results = {}
+    to_check = []
+    for url in dict.fromkeys(u for u in urls if u):
+        if not _is_checkable(url):
+            results[url] = False
+            continue
+        cached = _cached_result(url)
+        if cached is None:
+            to_check.append(url)
+        else:
+            results[url] = cached
+
+    attrs["checked"] = len(to_check)
+    if to_check:
+        with ThreadPoolExecutor(max_workers=min(IMAGE_WORKERS, len(to_check))) as pool:
+            checked = list(pool.map(bind(_check_image), to_check))
+        now = time.time()
+        with _cache_lock:
+            cache = _load_cache()
+            for url, (status, content_type) in zip(to_check, checked):
+                cache[url] = [status, content_type, now]
+                results[url] = _is_image(status, content_type)
+            _save_cache()
+
+    return results
+
+
 def validate_image_url(url):
     """Check if a URL actually resolves to an image (HEAD request)."""
-    if not url:
-        return False
-    if not url.startswith(("http://", "https://")):
-        return False
-    try:
-        resp = requests.head(url, timeout=5, allow_redirects=True)
-        content_type = resp.headers.get("content-type", "")
-        return resp.status_code == 200 and ("image" in content_type or "octet-stream" in content_type)
-    except Exception:
+    if not _is_checkable(url):
         return False
+    return validate_image_urls([url])[url]
 
 
-def get_image_with_fallback(entry, title, category=None, validate=False):
-    """Orchestrate: try RSS image -> validate -> stock photo fallback."""
-    url = get_image_from_entry(entry) if entry else None
-
+def _resolve_image(url, title, category, valid):
+    """Use the RSS image if it passed validation, else a stock photo."""
     if url:
-        if validate and not validate_image_url(url):
+        if not valid:
             print(f"         ⚠️ Image URL failed validation for: '{title[:30]}...'")
-            url = None
         else:
             print(f"         ✅ Using real image for: '{title[:30]}...'")
             return url
@@ -145,3 +281,24 @@ def get_image_with_fallback(entry, title, category=None, validate=False):
     # Fallback to curated stock photo (always works, no external API dependency)
     print(f"         🖼️ Using stock photo for: '{title[:30]}...'")
     return _pick_stock_image(title, category)
+
+
+def get_image_with_fallback(entry, title, category=None, validate=False):
+    """Orchestrate: try RSS image -> validate -> stock photo fallback."""
+    url = get_image_from_entry(entry) if entry else None
+    valid = validate_image_url(url) if (url and validate) else True
+    return _resolve_image(url, title, category, valid)
+
+
+def get_images_with_fallback(items, validate=False):
+    """Batch version of get_image_with_fallback for a whole section.
+
+    items: list of (entry, title, category). All candidate URLs are validated together,
+    so a section pays for its slowest image check instead of the sum of them.
+    """
+    urls = [get_image_from_entry(entry) if entry else None for entry, _, _ in items]
+    valid = validate_image_urls(urls) if validate else {}
+    return [
+        _resolve_image(url, title, category, valid.get(url, not validate))
+        for url, (_, title, category) in zip(urls, items)
+    ]
@@ -0,0 +1,141 @@
+"""
+Per-edition newsletter delivery ledger.
+Records which recipients were already sent (or permanently rejected) so a crashed or
+timed-out send can be rerun and continue where it stopped. Progress is buffered and
+committed in chunks: one write per LEDGER_FLUSH_SIZE recipients, not one per email.
+
+Backends (KSJ_LEDGER): "firestore", "sqlite" (local file, for development and
+benchmarks) or "off". The default follows KSJ_STORAGE: Firestore on the Firestore
+storage backend, SQLite otherwise.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+
+from app.mailer import REJECTED
+from app.storage import STORAGE_BACKEND
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LEDGER_BACKEND = os.getenv("KSJ_LEDGER") or ("firestore" if STORAGE_BACKEND == "firestore" else "sqlite")
+LEDGER_PATH = os.getenv("KSJ_LEDGER_PATH", os.path.join(BASE_DIR, ".cache", "ledger.sqlite3"))
+LEDGER_FLUSH_SIZE = 500
+LEDGER_COLLECTION = "newsletter_deliveries"
+
+SENT = "sent"  # REJECTED (bad address, retrying won't help) comes from app.mailer
+
+
+def recipient_key(email: str) -> int:
+    """Signed 8-byte digest of a normalized email; compact enough to hold every key in memory."""
+    return int.from_bytes(hashlib.blake2b(email.encode(), digest_size=8).digest(), "big", signed=True)
+
+
+class _Ledger:
+    """Buffers results and hands them to _commit() in chunks."""
+
+    def __init__(self, edition_id: str):
+        self.edition_id = edition_id
+        self._pending = []  # (key, status)
+        self._lock = threading.Lock()
+
+    def completed(self) -> set:
+        """Keys of recipients that must not be sent to again for this edition."""
+        raise NotImplementedError
+
+    def _commit(self, rows):
+        raise NotImplementedError
+
+    def record(self, delivered, failed):
+        """mailer.deliver on_result callback. Failures other than rejections stay retryable."""
+        rows = [(recipient_key(r.email), SENT) for r in delivered]
+        rows += [(recipient_key(r.email), REJECTED) for r, reason in failed if reason == REJECTED]
+        with self._lock:
+            self._pending.extend(rows)
+            if len(self._pending) < LEDGER_FLUSH_SIZE:
+                return
+            rows, self._pending = self._pending, []
+        self._commit(rows)
+
+    def flush(self):
+        with self._lock:
+            rows, self._pending = self._pending, []
+        if rows:
+            self._commit(rows)
+
+
+class FirestoreLedger(_Ledger):
+    """newsletter_deliveries/<edition>/chunks/<auto-id>: one document per committed chunk."""
+
+    def __init__(self, edition_id: str):
+        super().__init__(edition_id)
+        from app.db import get_firestore
+        from firebase_admin import firestore
+        self._server_timestamp = firestore.SERVER_TIMESTAMP
+        self._chunks = get_firestore().collection(LEDGER_COLLECTION).document(edition_id).collection("chunks")
+
+    @staticmethod
+    def _hex(key):
+        return key.to_bytes(8, "big", signed=True).hex()
+
+    def completed(self) -> set:
+        keys = set()
+        for doc in self._chunks.stream():
+            data = doc.to_dict() or {}
+            for status in (SENT, REJECTED):
+                keys.update(int.from_bytes(bytes.fromhex(h), "big", signed=True) for h in data.get(status) or [])
+        return keys
+
+    def _commit(self, rows):
+        self._chunks.document().set({
+            SENT: [self._hex(k) for k, status in rows if status == SENT],
+            REJECTED: [self._hex(k) for k, status in rows if status == REJECTED],
+            "committedAt": self._server_timestamp,
+        })
+
+
+class SQLiteLedger(_Ledger):
+    """Local stand-in with the same semantics, one row per recipient."""
+
+    def __init__(self, edition_id: str, path: str = LEDGER_PATH):
+        super().__init__(edition_id)
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS deliveries ("
+            " edition TEXT NOT NULL, recipient INTEGER NOT NULL, status TEXT NOT NULL,"
+            " PRIMARY KEY (edition, recipient)) WITHOUT ROWID"
+        )
+        self._conn.commit()
+
+    def completed(self) -> set:
+        cursor = self._conn.execute("SELECT recipient FROM deliveries WHERE edition = ?", (self.edition_id,))
+        return {row[0] for row in cursor}
+
+    def _commit(self, rows):
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO deliveries (edition, recipient, status) VALUES (?, ?, ?)",
+                [(self.edition_id, key, status) for key, status in rows],
+            )
+
+
+class _NoLedger(_Ledger):
+    def completed(self) -> set:
+        return set()
+
+    def _commit(self, rows):
+        pass
+
+
+def open_ledger(edition_id: str, backend: str = None) -> _Ledger:
+    """Ledger for one edition using the configured backend."""
+    backend = backend or LEDGER_BACKEND
+    if backend == "firestore":
+        return FirestoreLedger(edition_id)
+    if backend == "sqlite":
+        return SQLiteLedger(edition_id)
+    if backend == "off":
+        return _NoLedger(edition_id)
+    raise ValueError(f"Unknown KSJ_LEDGER backend: {backend}")
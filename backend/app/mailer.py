@@ -0,0 +1,112 @@
+import hashlib
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import resend
+
+from app.ratelimit import RateLimiter
+from app.spans import bind, span
+
+BATCH_SIZE = 100  # Resend batch endpoint limit
+MAX_CONCURRENCY = int(os.getenv("KSJ_MAIL_CONCURRENCY", "4"))
+REQUESTS_PER_SECOND = float(os.getenv("KSJ_MAIL_RPS", "2"))  # Resend's default API rate limit
+MAX_ATTEMPTS = 3
+RETRY_BASE_DELAY = 1.0
+REJECTED = "rejected"  # failure reason for recipients refused by batch validation
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _idempotency_key(messages):
+    """Same recipients + subject -> same key, so a retried batch is never delivered twice."""
+    digest = hashlib.sha256()
+    for message in messages:
+        digest.update(f"{message['subject']}|{message['to'][0]}\n".encode())
+    return digest.hexdigest()
+
+
+def _send_batch(limiter, recipients, make_message, delay):
+    """One batch call. Returns (recipients delivered, recipients rejected by validation)."""
+    if delay:
+        time.sleep(delay)
+    messages = [make_message(email) for email in recipients]
+    limiter.acquire(requests=1)
+    with span("mail.batch", recipients=len(messages), bytes=sum(len(m["html"]) for m in messages)):
+        response = resend.Batch.send(messages, {
+            "batch_validation": "permissive",
+            "idempotency_key": _idempotency_key(messages),
+        })
+    rejected = {error["index"] for error in (response or {}).get("errors") or []}
+    delivered = [r for i, r in enumerate(recipients) if i not in rejected]
+    return delivered, [(recipients[i], REJECTED) for i in sorted(rejected)]
+
+
+def deliver(recipients, make_message, on_result=None):
+    """Send one message per recipient through Resend's batch endpoint.
+
+    recipients may be any iterable (including a generator still reading from the
+    database); batches are dispatched as soon as they fill. Up to MAX_CONCURRENCY
+    batches are in flight under a shared requests/second limit. A batch call that
+    fails outright is retried with backoff; recipients rejected by validation are not.
+    on_result(delivered, failed) is called after every batch, where failed is a list
+    of (email, reason). Returns a report dict.
+    """
+    limiter = RateLimiter(window=1, requests=REQUESTS_PER_SECOND)
+    delivered = 0
+    failed = []
+    batches = 0
+    start = time.monotonic()
+
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENCY) as pool:
+        in_flight = {}  # future -> (recipients, attempt)
+
+        def submit(batch, attempt):
+            delay = RETRY_BASE_DELAY * 2 ** (attempt - 2) if attempt > 1 else 0
+            in_flight[pool.submit(bind(_send_batch), limiter, batch, make_message, delay)] = (batch, attempt)
+
+        def collect(return_when):
+            nonlocal delivered, batches
+            done, _ = wait(list(in_flight), return_when=return_when)
+            for future in done:
+                batch, attempt = in_flight.pop(future)
+                try:
+                    ok, rejected = future.result()
+                except Exception as e:
+                    if attempt < MAX_ATTEMPTS:
+                        print(f"  ⚠️ Batch of {len(batch)} failed ({e}), retry {attempt}/{MAX_ATTEMPTS - 1}")
+                        submit(batch, attempt + 1)
+                        continue
+                    ok, rejected = [], [(email, str(e)) for email in batch]
+                batches += 1
+                delivered += len(ok)
+                failed.extend(rejected)
+                if on_result:
+                    on_result(ok, rejected)
+
+        for batch in _chunks(recipients, BATCH_SIZE):
+            # Keep memory flat: don't read further ahead than the pool can send
+            while len(in_flight) >= MAX_CONCURRENCY * 2:
+                collect(FIRST_COMPLETED)
+            submit(batch, 1)
+        while in_flight:
+            collect(FIRST_COMPLETED)
+
+    elapsed = time.monotonic() - start
+    return {
+        "delivered": delivered,
+        "failed": len(failed),
+        "failed_recipients": failed,
+        "batches": batches,
+        "elapsed": elapsed,
+        "per_second": delivered / elapsed if elapsed > 0 else 0.0,
+    }
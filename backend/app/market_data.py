@@ -0,0 +1,85 @@
+import threading
+import time
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from app.market_history import read_range, update_history
+
+SNAPSHOT_MAX_AGE = 300  # seconds a quote is reused by later tasks in the same run
+
+# In-process snapshot shared by the ticker and the Deep Dive: symbol -> (quote, fetched_at)
+_quotes = {}
+_quotes_lock = threading.Lock()
+
+
+def _recent_closes(symbols):
+    """Refresh the history store in one batched download and return recent closes, one column per symbol."""
+    failed = set(update_history(symbols))
+    # Symbols that failed to refresh are dropped rather than quoted from stale bars
+    fresh = [s for s in symbols if s not in failed]
+    since = date.today() - timedelta(days=10)
+    return pd.DataFrame({symbol: read_range(symbol, start=since)["Close"] for symbol in fresh},
+                        columns=fresh)
+
+
+def _quotes_from_closes(close):
+    """Last price, previous close and change for every column at once.
+
+    Columns have gaps on different days (crypto trades on weekends, TSX holidays differ
+    from NYSE), so the last two *valid* rows are located per column rather than using
+    the frame's last two rows.
+    """
+    arr = close.to_numpy(dtype=float)
+    if arr.shape[0] == 0:
+        return {}
+    rows = np.arange(arr.shape[0])[:, None]
+    valid_rows = np.where(~np.isnan(arr), rows, -1)
+    last_idx = valid_rows.max(axis=0)
+    prev_idx = np.where(rows < last_idx, valid_rows, -1).max(axis=0)
+
+    cols = np.arange(arr.shape[1])
+    last = np.where(last_idx >= 0, arr[last_idx.clip(0), cols], np.nan)
+    prev = np.where(prev_idx >= 0, arr[prev_idx.clip(0), cols], np.nan)
+    change = last - prev
+    with np.errstate(divide="ignore", invalid="ignore"):
+        change_pct = change / prev * 100
+
+    quotes = {}
+    for i, symbol in enumerate(close.columns):
+        if np.isnan(last[i]) or np.isnan(prev[i]) or prev[i] == 0:
+            continue
+        quotes[symbol] = {
+            "price": float(last[i]),
+            "prev_close": float(prev[i]),
+            "change": float(change[i]),
+            "change_pct": float(change_pct[i]),
+        }
+    return quotes
+
+
+def _fetch_quotes(symbols):
+    """Incremental history update (failed symbols are retried individually), then quotes."""
+    try:
+        return _quotes_from_closes(_recent_closes(symbols))
+    except Exception as e:
+        print(f"   ⚠️ Market data fetch failed: {e}")
+        return {}
+
+
+def get_snapshot(symbols: list, max_age: int = SNAPSHOT_MAX_AGE):
+    """Return {symbol: quote} for the requested symbols.
+
+    Each quote is a dict with price, prev_close, change and change_pct. Symbols already
+    fetched by another task in the last `max_age` seconds are not downloaded again.
+    Symbols with no data are left out.
+    """
+    with _quotes_lock:
+        now = time.time()
+        missing = [s for s in dict.fromkeys(symbols) if s not in _quotes or now - _quotes[s][1] > max_age]
+        if missing:
+            fetched_at = time.time()
+            for symbol, quote in _fetch_quotes(missing).items():
+                _quotes[symbol] = (quote, fetched_at)
+        return {s: _quotes[s][0] for s in symbols if s in _quotes}
@@ -0,0 +1,162 @@
+import os
+import re
+import threading
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from app.spans import span
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# One compressed columnar .npz file per symbol: day (days since epoch) + OHLCV arrays
+HISTORY_DIR = os.getenv("KSJ_MARKET_DIR", os.path.join(BASE_DIR, ".cache", "market"))
+BACKFILL_DAYS = 400  # history pulled the first time a symbol is seen
+FIELDS = ("Open", "High", "Low", "Close", "Volume")
+
+yf = None  # yfinance is slow to import, so it's loaded on the first download
+
+_series = {}  # symbol -> {"day": int64[], "Open": float64[], ...}
+_lock = threading.RLock()
+
+
+def _path(symbol):
+    return os.path.join(HISTORY_DIR, re.sub(r"[^A-Za-z0-9_.-]", "_", symbol) + ".npz")
+
+
+def _load(symbol):
+    if symbol not in _series:
+        try:
+            with np.load(_path(symbol)) as f:
+                _series[symbol] = {k: f[k] for k in ("day",) + FIELDS}
+        except (OSError, KeyError, ValueError):
+            _series[symbol] = None
+    return _series[symbol]
+
+
+def _save(symbol, cols):
+    os.makedirs(HISTORY_DIR, exist_ok=True)
+    tmp = f"{_path(symbol)}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        np.savez_compressed(f, **cols)
+    os.replace(tmp, _path(symbol))
+    _series[symbol] = cols
+
+
+def _to_day(d):
+    return int(np.datetime64(d, "D").astype(np.int64))
+
+
+def _from_day(day):
+    return np.datetime64(int(day), "D").astype(object)
+
+
+def _frame_to_columns(frame):
+    frame = frame.dropna(subset=["Close"])
+    cols = {"day": frame.index.values.astype("datetime64[D]").astype(np.int64)}
+    for field in FIELDS:
+        cols[field] = frame[field].to_numpy(dtype=float) if field in frame else np.full(len(frame), np.nan)
+    return cols
+
+
+def _append(symbol, new):
+    """Keep stored bars before the first new bar; the new bars replace the rest.
+
+    Only the most recent stored bar is ever rewritten (it may have been a partial day).
+    """
+    old = _load(symbol)
+    if old is not None and len(old["day"]):
+        keep = old["day"] < new["day"][0]
+        new = {k: np.concatenate([old[k][keep], new[k]]) for k in new}
+    _save(symbol, new)
+
+
+def _symbol_frame(data, symbol):
+    if data is None or data.empty:
+        return None
+    if isinstance(data.columns, pd.MultiIndex):
+        if symbol not in data.columns.get_level_values(1):
+            return None
+        return data.xs(symbol, axis=1, level=1)
+    return data
+
+
+def _fetch_since(symbols, starts):
+    """One batched download from the earliest needed date. Returns the symbols that got no bars."""
+    global yf
+    if yf is None:
+        import yfinance as yf
+    with span("market.download", symbols=len(symbols)):
+        data = yf.download(symbols, start=min(starts.values()).isoformat(), interval="1d",
+                           progress=False, threads=True)
+    failed = []
+    for symbol in symbols:
+        frame = _symbol_frame(data, symbol)
+        if frame is not None:
+            if frame.index.tz is not None:
+                frame = frame.tz_localize(None)
+            frame = frame[frame.index >= pd.Timestamp(starts[symbol])]
+        cols = _frame_to_columns(frame) if frame is not None else None
+        if cols is None or not len(cols["day"]):
+            failed.append(symbol)
+            continue
+        _append(symbol, cols)
+    return failed
+
+
+def update_history(symbols: list):
+    """Bring the store up to date, downloading only bars missing since the last run.
+
+    Symbols are fetched in one batch from the earliest date any of them needs; a symbol
+    that comes back empty is retried on its own. Returns the symbols that still failed.
+    """
+    symbols = list(dict.fromkeys(symbols))
+    with _lock:
+        backfill = date.today() - timedelta(days=BACKFILL_DAYS)
+        starts = {}
+        for symbol in symbols:
+            cols = _load(symbol)
+            if cols is not None and len(cols["day"]):
+                # Re-fetch the last stored bar too: it may have been captured mid-session
+                starts[symbol] = _from_day(cols["day"][-1])
+            else:
+                starts[symbol] = backfill
+
+        try:
+            failed = _fetch_since(symbols, starts)
+        except Exception as e:
+            print(f"   ⚠️ Batch history download failed: {e}")
+            failed = symbols
+        if len(symbols) == 1:
+            return failed
+
+        still_failed = []
+        for symbol in failed:
+            try:
+                still_failed += _fetch_since([symbol], {symbol: starts[symbol]})
+            except Exception as e:
+                print(f"   ⚠️ Retry failed for {symbol}: {e}")
+                still_failed.append(symbol)
+        return still_failed
+
+
+def read_range(symbol: str, start=None, end=None):
+    """Stored daily bars for symbol between start and end (inclusive dates) as a DataFrame."""
+    with _lock:
+        cols = _load(symbol)
+    if cols is None:
+        return pd.DataFrame(columns=list(FIELDS), index=pd.DatetimeIndex([]))
+    days = cols["day"]
+    lo = np.searchsorted(days, _to_day(start), "left") if start else 0
+    hi = np.searchsorted(days, _to_day(end), "right") if end else len(days)
+    index = pd.DatetimeIndex(days[lo:hi].astype("datetime64[D]"))
+    return pd.DataFrame({field: cols[field][lo:hi] for field in FIELDS}, index=index)
+
+
+def period_change(symbol: str, days: int):
+    """Percent change in close over the last `days` calendar days, or None if not enough history."""
+    close = read_range(symbol, start=date.today() - timedelta(days=days))["Close"].dropna()
+    if len(close) < 2 or close.iloc[0] == 0:
+        return None
+    return float((close.iloc[-1] / close.iloc[0] - 1) * 100)
@@ -0,0 +1,395 @@
+"""
+Newsletter email rendering.
+compile_email() renders every section of an edition once; CompiledEmail.render() then
+builds each subscriber's email by joining those precomputed fragments with a few
+per-subscriber slots (greeting, chosen sections).
+"""
+import os
+import re
+from dataclasses import dataclass
+from datetime import datetime
+from html import escape
+from typing import Optional
+
+SITE_URL = "https://theksj.com"
+
+# Body sections in the order they appear; the ticker sits above the body
+BODY_SECTIONS = ("whats_news", "hero", "featured", "deep_dive", "global_briefing", "opinions", "campus")
+SECTIONS = ("ticker",) + BODY_SECTIONS
+
+
+@dataclass(frozen=True)
+class Subscriber:
+    email: str
+    name: Optional[str] = None
+    sections: Optional[tuple] = None  # section keys the subscriber wants; None means everything
+
+
+def slugify(text: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", text.lower()).strip("-")[:60]
+
+
+# --- Section fragments (rendered once per edition) ---
+
+def _ticker_html(edition) -> str:
+    if edition.items("ticker"):
+        ticker_items = []
+        for item in edition.items("ticker"):
+            bg = "#dcfce7" if item.get("isUp") else "#fee2e2"
+            text_color = "#166534" if item.get("isUp") else "#991b1b"
+            arrow = "▲" if item.get("isUp") else "▼"
+            ticker_items.append(
+                f'<td style="padding:8px 4px;text-align:center;font-size:11px;font-family:Arial,sans-serif;">'
+                f'<div style="background:#ffffff;border:1px solid #e4e4e7;border-radius:4px;padding:8px 6px;">'
+                f'<span style="color:#18181b;font-weight:bold;font-size:10px;text-transform:uppercase;letter-spacing:0.5px;">{item["symbol"]}</span><br>'
+                f'<span style="color:#18181b;font-size:14px;font-weight:bold;">{item["price"]}</span><br>'
+                f'<span style="background:{bg};color:{text_color};font-size:10px;font-weight:bold;padding:2px 6px;border-radius:3px;display:inline-block;margin-top:2px;">{arrow} {item.get("change","")}</span>'
+                f'</div></td>'
+            )
+        return f"""
+        <table width="100%" cellpadding="0" cellspacing="0" style="background:#f4f4f5;padding:8px 4px;border-bottom:1px solid #e4e4e7;">
+          <tr>{"".join(ticker_items)}</tr>
+        </table>"""
+    return ""
+
+
+def _whats_news_html(edition) -> str:
+    if edition.whats_news:
+        wn = edition.whats_news
+        biz_bullets = "".join(
+            f'<li style="margin-bottom:6px;font-size:13px;color:#3f3f46;line-height:1.5;">{b.lstrip("- •")}</li>'
+            for b in (wn.get("business") or [])
+        )
+        world_bullets = "".join(
+            f'<li style="margin-bottom:6px;font-size:13px;color:#3f3f46;line-height:1.5;">{b.lstrip("- •")}</li>'
+            for b in (wn.get("world") or [])
+        )
+        return f"""
+        <div style="margin-bottom:32px;">
+          <h2 style="font-family:Georgia,serif;font-size:16px;text-transform:uppercase;letter-spacing:2px;border-bottom:2px solid #18181b;padding-bottom:6px;margin-bottom:12px;">What's News</h2>
+          <h3 style="font-size:11px;text-transform:uppercase;letter-spacing:1px;color:#991b1b;margin-bottom:8px;">Business & Finance</h3>
+          <ul style="padding-left:16px;margin:0 0 16px 0;">{biz_bullets}</ul>
+          <h3 style="font-size:11px;text-transform:uppercase;letter-spacing:1px;color:#991b1b;margin-bottom:8px;">World</h3>
+          <ul style="padding-left:16px;margin:0;">{world_bullets}</ul>
+        </div>"""
+    return ""
+
+
+def _hero_html(edition) -> str:
+    if edition.hero:
+        h = edition.hero
+        hero_slug = f"hero-{slugify(h.get('title', ''))}"
+        return f"""
+        <div style="margin-bottom:32px;border-bottom:1px solid #e4e4e7;padding-bottom:24px;">
+          <span style="font-size:10px;text-transform:uppercase;letter-spacing:2px;color:#991b1b;font-weight:bold;">Special Report</span>
+          <h1 style="font-family:Georgia,serif;font-size:26px;margin:8px 0;line-height:1.2;">
+            <a href="{SITE_URL}/article/{hero_slug}" style="color:#18181b;text-decoration:none;">{h.get("title","")}</a>
+          </h1>
+          <p style="font-family:Georgia,serif;font-size:15px;color:#52525b;line-height:1.6;margin:0 0 8px 0;">{h.get("subtitle","")}</p>
+          <span style="font-size:10px;color:#a1a1aa;text-transform:uppercase;">By {h.get("author","Staff")}</span>
+        </div>"""
+    return ""
+
+
+def _featured_html(edition) -> str:
+    if edition.items("featured"):
+        cards = []
+        for i, story in enumerate(edition.items("featured")[:4]):
+            slug = f"featured-{i}-{slugify(story.get('title', ''))}"
+            cards.append(f"""
+            <div style="padding:16px 0;border-bottom:1px solid #f4f4f5;">
+              <span style="font-size:10px;text-transform:uppercase;letter-spacing:1px;color:#991b1b;font-weight:bold;">{story.get("category","")}</span>
+              <h3 style="font-family:Georgia,serif;font-size:16px;margin:4px 0;">
+                <a href="{SITE_URL}/article/{slug}" style="color:#18181b;text-decoration:none;">{story.get("title","")}</a>
+              </h3>
+              <p style="font-size:13px;color:#71717a;margin:4px 0 0 0;line-height:1.5;">{story.get("summary","")}</p>
+            </div>""")
+        return f"""
+        <div style="margin-bottom:32px;">
+          <h2 style="font-family:Georgia,serif;font-size:14px;text-transform:uppercase;letter-spacing:2px;border-bottom:1px solid #e4e4e7;padding-bottom:6px;margin-bottom:4px;">Featured Stories</h2>
+          {"".join(cards)}
+        </div>"""
+    return ""
+
+
+def _deep_dive_html(edition) -> str:
+    if edition.deep_dive:
+        dd = edition.deep_dive
+        dd_cards = []
+        for i, card in enumerate(dd.get("cards") or []):
+            dd_cards.append(f"""
+            <div style="padding:12px 0;border-bottom:1px solid #3f3f46;">
+              <h3 style="font-family:Georgia,serif;font-size:14px;color:#ffffff;margin:0 0 4px 0;">{card.get("title","")}</h3>
+              <p style="font-size:12px;color:#a1a1aa;line-height:1.5;margin:0;">{card.get("analysis","")}</p>
+            </div>""")
+        stat = dd.get("stat") or {}
+        return f"""
+        <div style="background:#18181b;padding:24px;margin:0 -24px 32px -24px;">
+          <h2 style="font-size:13px;text-transform:uppercase;letter-spacing:2px;color:#ffffff;border-bottom:1px solid #3f3f46;padding-bottom:8px;margin-bottom:12px;">📊 Market Deep Dive</h2>
+          {"".join(dd_cards)}
+          <div style="text-align:center;padding:16px 0 0 0;">
+            <span style="font-size:28px;font-weight:bold;color:#ffffff;">{stat.get("value","")}</span><br>
+            <span style="font-size:10px;text-transform:uppercase;letter-spacing:1px;color:#a1a1aa;">{stat.get("label","")}</span>
+          </div>
+        </div>"""
+    return ""
+
+
+def _global_briefing_html(edition) -> str:
+    if edition.items("global_briefing"):
+        items = []
+        for i, item in enumerate(edition.items("global_briefing")[:3]):
+            items.append(f"""
+            <div style="padding:12px 0;border-bottom:1px solid #f4f4f5;">
+              <span style="font-family:Georgia,serif;font-size:20px;color:#e4e4e7;font-weight:bold;margin-right:8px;">0{i+1}</span>
+              <strong style="font-family:Georgia,serif;font-size:15px;color:#18181b;">{item.get("headline","")}</strong>
+              <p style="font-size:13px;color:#71717a;margin:4px 0 0 0;line-height:1.5;">{item.get("context","")}</p>
+            </div>""")
+        return f"""
+        <div style="margin-bottom:32px;">
+          <h2 style="font-family:Georgia,serif;font-size:14px;text-transform:uppercase;letter-spacing:2px;border-bottom:1px solid #e4e4e7;padding-bottom:6px;margin-bottom:8px;">Global Briefing</h2>
+          {"".join(items)}
+        </div>"""
+    return ""
+
+
+def _opinions_html(edition) -> str:
+    if edition.items("opinions"):
+        op_items = []
+        for op in edition.items("opinions")[:3]:
+            op_items.append(f"""
+            <div style="padding:10px 0;border-bottom:1px solid #f4f4f5;">
+              <h4 style="font-family:Georgia,serif;font-size:14px;color:#18181b;margin:0 0 2px 0;">{op.get("title","")}</h4>
+              <span style="font-size:10px;color:#991b1b;text-transform:uppercase;">{op.get("author","")} — {op.get("role","")}</span>
+              <p style="font-size:12px;color:#71717a;margin:4px 0 0 0;line-height:1.4;">{op.get("snippet","")}</p>
+            </div>""")
+        return f"""
+        <div style="margin-bottom:32px;">
+          <h2 style="font-family:Georgia,serif;font-size:14px;text-transform:uppercase;letter-spacing:2px;border-bottom:1px solid #e4e4e7;padding-bottom:6px;margin-bottom:8px;">Opinion</h2>
+          {"".join(op_items)}
+        </div>"""
+    return ""
+
+
+def _campus_html(edition) -> str:
+    if edition.items("campus"):
+        c_items = []
+        for item in edition.items("campus")[:3]:
+            c_items.append(f"""
+            <div style="padding:10px 0;border-bottom:1px solid #f4f4f5;">
+              <span style="font-size:9px;text-transform:uppercase;letter-spacing:1px;color:#991b1b;font-weight:bold;">{item.get("category","Campus")}</span>
+              <h4 style="font-family:Georgia,serif;font-size:14px;color:#18181b;margin:2px 0;">
+                <a href="{item.get('link','#')}" style="color:#18181b;text-decoration:none;">{item.get("title","")}</a>
+              </h4>
+              <p style="font-size:12px;color:#71717a;margin:2px 0 0 0;line-height:1.4;">{item.get("summary","")[:120]}...</p>
+            </div>""")
+        return f"""
+        <div style="margin-bottom:32px;">
+          <h2 style="font-family:Georgia,serif;font-size:14px;text-transform:uppercase;letter-spacing:2px;border-bottom:1px solid #e4e4e7;padding-bottom:6px;margin-bottom:8px;">Campus & Career</h2>
+          {"".join(c_items)}
+        </div>"""
+    return ""
+
+
+
+# --- Payload size (Gmail clips messages over ~102KB) ---
+
+EMAIL_BYTE_BUDGET = int(os.getenv("KSJ_EMAIL_BUDGET", "90000"))
+# Hoisting is only tried on an edition still over budget after minification
+HOIST_STYLES = os.getenv("KSJ_EMAIL_HOIST_STYLES", "1") == "1"
+
+# Sections given up first when an edition is over budget; the hero is always kept
+TRIM_ORDER = ("campus", "opinions", "global_briefing", "featured", "deep_dive", "ticker", "whats_news")
+SECTION_TITLES = {
+    "whats_news": "What's News", "featured": "Featured Stories", "deep_dive": "Market Deep Dive",
+    "global_briefing": "Global Briefing", "opinions": "Opinion", "campus": "Campus & Career",
+}
+
+_STYLE_ATTR = re.compile(r'style="([^"]*)"')
+_COMMENT = re.compile(r"<!--(?!\[if).*?-->", re.S)
+_BLOCK_TAG = r"</?(?:html|head|meta|style|body|div|p|h[1-6]|table|tr|td|ul|li|br)\b"
+_SPACE_BEFORE_BLOCK = re.compile(rf"[ \t\r\n]+(?={_BLOCK_TAG})")
+_SPACE_AFTER_BLOCK = re.compile(rf"({_BLOCK_TAG}[^>]*>)[ \t\r\n]+")
+_SPACE_RUN = re.compile(r"[ \t\r\n]{2,}")
+
+
+def _minify(html: str) -> str:
+    """Drop comments and whitespace around block-level tags; collapse the rest to single spaces."""
+    html = _COMMENT.sub("", html)
+    html = _SPACE_BEFORE_BLOCK.sub("", html)
+    html = _SPACE_AFTER_BLOCK.sub(r"\1", html)
+    return _SPACE_RUN.sub(" ", html)
+
+
+def _hoist_styles(parts: dict):
+    """Move inline styles repeated across the email into classes in one <style> block.
+
+    Only styles where the class saves bytes are hoisted; one-off styles stay inline.
+    Returns (rewritten parts, css).
+    """
+    counts = {}
+    for text in parts.values():
+        for style in _STYLE_ATTR.findall(text):
+            counts[style] = counts.get(style, 0) + 1
+    classes = {}
+    for style, count in sorted(counts.items(), key=lambda kv: -kv[1] * len(kv[0])):
+        name = f"k{len(classes)}"
+        # style="..." -> class="kN" on every use, plus one .kN{...} rule
+        saved = count * (len(style) - len(name)) - (len(style) + len(name) + 3)
+        if count > 1 and saved > 0:
+            classes[style] = name
+
+    def to_class(match):
+        name = classes.get(match.group(1))
+        return f'class="{name}"' if name else match.group(0)
+
+    rewritten = {key: _STYLE_ATTR.sub(to_class, text) for key, text in parts.items()}
+    return rewritten, "".join(f".{name}{{{style}}}" for style, name in classes.items())
+
+
+def _read_online_html(section: str) -> str:
+    """Stand-in for a section trimmed to fit the byte budget."""
+    title = SECTION_TITLES.get(section)
+    if not title:
+        return ""
+    return (f'<p style="font-size:12px;margin:0 0 24px 0;"><a href="{SITE_URL}" '
+            f'style="color:#991b1b;font-weight:bold;">{title} — read it online →</a></p>')
+
+
+class CompiledEmail:
+    """An edition rendered once into static fragments plus per-subscriber slots.
+
+    Fragments go through a size pass at compile time (minification, then style hoisting
+    and trimming low-priority sections only while over EMAIL_BYTE_BUDGET), so render()
+    stays a join.
+    """
+
+    def __init__(self, edition, budget: int = EMAIL_BYTE_BUDGET):
+        today = datetime.now().strftime("%A, %B %d, %Y")
+        sections = {
+            "ticker": _ticker_html(edition),
+            "whats_news": _whats_news_html(edition),
+            "hero": _hero_html(edition),
+            "featured": _featured_html(edition),
+            "deep_dive": _deep_dive_html(edition),
+            "global_briefing": _global_briefing_html(edition),
+            "opinions": _opinions_html(edition),
+            "campus": _campus_html(edition),
+        }
+        raw = {f"section:{key}": ("\n      " if key in BODY_SECTIONS else "") + html for key, html in sections.items()}
+        raw["head"] = f"""<!DOCTYPE html>
+<html lang="en">
+<head><meta charset="UTF-8"><meta name="viewport" content="width=device-width,initial-scale=1.0"></head>
+<body style="margin:0;padding:0;background:#f4f4f5;font-family:-apple-system,BlinkMacSystemFont,'Segoe UI',Roboto,sans-serif;">
+  <div style="max-width:600px;margin:0 auto;background:#ffffff;">
+
+    <!-- HEADER -->
+    <div style="text-align:center;padding:24px 24px 16px 24px;border-bottom:3px double #18181b;">
+      <h1 style="font-family:Georgia,serif;font-size:28px;margin:0;letter-spacing:-0.5px;">The Keele Street Journal</h1>
+      <p style="font-size:11px;color:#71717a;margin:4px 0 0 0;font-style:italic;">{today} — Morning Edition</p>
+    </div>
+
+    """
+        raw["body_open"] = """
+
+    <!-- BODY -->
+    <div style="padding:24px;">"""
+        raw["greeting_open"] = '\n      <p style="font-family:Georgia,serif;font-size:15px;color:#18181b;margin:0 0 24px 0;">Good morning, '
+        raw["greeting_close"] = ".</p>"
+        raw["footer"] = f"""
+
+      <!-- CTA -->
+      <div style="text-align:center;padding:24px 0;border-top:2px solid #18181b;">
+        <a href="{SITE_URL}" style="display:inline-block;background:#18181b;color:#ffffff;padding:12px 32px;font-size:13px;font-weight:bold;text-decoration:none;text-transform:uppercase;letter-spacing:1px;">Read Full Edition →</a>
+      </div>
+    </div>
+
+    <!-- FOOTER -->
+    <div style="background:#18181b;padding:24px;text-align:center;">
+      <p style="font-family:Georgia,serif;font-size:14px;color:#ffffff;margin:0 0 8px 0;">The Keele Street Journal</p>
+      <p style="font-size:11px;color:#71717a;margin:0 0 12px 0;">AI-powered financial news for Economics students</p>
+      <p style="font-size:10px;color:#52525b;margin:0;">
+        You're receiving this because you subscribed at theksj.com<br>
+        """
+        raw["closing"] = f"""&copy; {datetime.now().year} The Keele Street Journal
+      </p>
+    </div>
+
+  </div>
+</body>
+</html>"""
+
+        self._parts = raw
+        self._bodies = {}  # joined body per distinct section selection; subscribers share a handful
+        before = self.max_size()
+
+        # Drop sections lowest priority first until the largest possible email fits
+        dropped = []
+        for section in (None,) + TRIM_ORDER:
+            if section:
+                if not sections[section]:
+                    continue
+                dropped.append(section)
+                raw = {**raw, f"section:{section}": "\n      " + _read_online_html(section)}
+            hoisted = self._fit(raw, budget)
+            if self.max_size() <= budget:
+                break
+
+        self.size_report = {"before": before, "after": self.max_size(), "budget": budget,
+                            "hoisted": hoisted, "dropped": dropped}
+
+    def _fit(self, raw: dict, budget: int) -> int:
+        """Minify the fragments, then hoist styles if still over budget. Returns the classes hoisted.
+
+        Inline styles are what most clients render reliably, so they are kept when minifying is enough.
+        """
+        self._parts, self._bodies = {key: _minify(text) for key, text in raw.items()}, {}
+        if not HOIST_STYLES or self.max_size() <= budget:
+            return 0
+        parts, css = _hoist_styles(self._parts)
+        if css:
+            parts["head"] = parts["head"].replace("</head>", f"<style>{css}</style></head>", 1)
+        self._parts, self._bodies = parts, {}
+        return css.count("{")
+
+    def _body(self, wanted: tuple) -> str:
+        body = self._bodies.get(wanted)
+        if body is None:
+            body = "".join(self._parts[f"section:{key}"] for key in BODY_SECTIONS if key in wanted)
+            self._bodies[wanted] = body
+        return body
+
+    def render(self, name: str = None, sections=None) -> str:
+        """One subscriber's email. Only the slots are built here; everything else is reused."""
+        wanted = tuple(key for key in SECTIONS if key in sections) if sections else SECTIONS
+        if not any(key in BODY_SECTIONS for key in wanted):
+            wanted = SECTIONS  # Never send an empty email because of stale preferences
+        p = self._parts
+        parts = [p["head"]]
+        if "ticker" in wanted:
+            parts.append(p["section:ticker"])
+        parts.append(p["body_open"])
+        if name:
+            parts += (p["greeting_open"], escape(name), p["greeting_close"])
+        parts += (self._body(wanted), p["footer"])
+        parts.append(p["closing"])
+        return "".join(parts)
+
+    def max_size(self) -> int:
+        """Bytes of the largest email this edition can produce (all sections, long name)."""
+        return len(self.render("x" * 64, None).encode())
+
+
+def compile_email(edition) -> CompiledEmail:
+    """Render the edition's sections once, ready for per-subscriber render() calls."""
+    return CompiledEmail(edition)
+
+
+def format_size_report(report: dict) -> str:
+    line = (f"{report['before'] / 1024:.1f}KB → {report['after'] / 1024:.1f}KB "
+            f"(budget {report['budget'] / 1024:.0f}KB")
+    if report["hoisted"]:
+        line += f", {report['hoisted']} style(s) hoisted"
+    if report["dropped"]:
+        line += f", trimmed: {', '.join(report['dropped'])}"
+    return line + ")"
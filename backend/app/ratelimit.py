@@ -0,0 +1,45 @@
+import threading
+import time
+
+
+class RateLimiter:
+    """Token-bucket limiter over one or more budgets per `window` seconds.
+
+    e.g. RateLimiter(requests=60, tokens=1_000_000) for a per-minute quota, or
+    RateLimiter(window=1, requests=2) for 2 requests/second. acquire() blocks until
+    every bucket can cover the call, so concurrent callers spread out under the quota
+    instead of tripping 429s.
+    """
+
+    def __init__(self, window=60.0, **limits):
+        self.window = float(window)
+        self.capacity = {bucket: float(limit) for bucket, limit in limits.items()}
+        self.level = dict(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self.updated
+        self.updated = now
+        for bucket, capacity in self.capacity.items():
+            self.level[bucket] = min(capacity, self.level[bucket] + elapsed * capacity / self.window)
+
+    def acquire(self, **amounts):
+        need = {b: float(min(amounts.get(b, 0), self.capacity[b])) for b in self.capacity}
+        while True:
+            with self.lock:
+                self._refill()
+                if all(self.level[b] >= n for b, n in need.items()):
+                    for b, n in need.items():
+                        self.level[b] -= n
+                    return
+                wait = max((n - self.level[b]) * self.window / self.capacity[b] for b, n in need.items())
+            time.sleep(wait)
+
+    def record(self, **amounts):
+        """Charge usage known only after the call (e.g. response tokens) without blocking."""
+        with self.lock:
+            self._refill()
+            for bucket, amount in amounts.items():
+                self.level[bucket] -= amount
@@ -1,15 +1,207 @@
-import feedparser
+import asyncio
+import hashlib
+import os
+import pickle
+import threading
+import time
+from urllib.parse import urlsplit
+
+from app.spans import span
 
 USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
 
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# On-disk feed cache: raw bytes + parsed entries + ETag/Last-Modified validators per URL
+FEED_CACHE_DIR = os.getenv("KSJ_FEED_CACHE_DIR", os.path.join(BASE_DIR, ".cache", "feeds"))
+FEED_TTL = int(os.getenv("KSJ_FEED_TTL", "900"))  # seconds before a cached feed is revalidated
+FEED_TIMEOUT = 15
+FEED_DEADLINE = float(os.getenv("KSJ_FEED_DEADLINE", "10"))  # per-feed budget for concurrent fetches
+FEED_HOST_CONNECTIONS = 2  # concurrent requests allowed per host
+
+# In-process memo so each feed is downloaded at most once per run, even across sections
+_feeds = {}
+_feed_locks = {}
+_feed_locks_guard = threading.Lock()
+
+
+def _feed_lock(url):
+    with _feed_locks_guard:
+        return _feed_locks.setdefault(url, threading.Lock())
+
+
+def _cache_path(url):
+    return os.path.join(FEED_CACHE_DIR, hashlib.sha1(url.encode()).hexdigest() + ".pickle")
+
+
+def _load_cached(url):
+    try:
+        with open(_cache_path(url), "rb") as f:
+            return pickle.load(f)
+    except (OSError, EOFError, pickle.PickleError, AttributeError):
+        return None
+
+
+def _save_cached(url, record):
+    try:
+        os.makedirs(FEED_CACHE_DIR, exist_ok=True)
+        tmp = f"{_cache_path(url)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(record, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, _cache_path(url))
+    except Exception as e:
+        print(f"      ⚠️ Could not write feed cache for {url}: {e}")
+
+
+def _conditional_headers(cached):
+    headers = {"User-Agent": USER_AGENT}
+    if cached:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("modified"):
+            headers["If-Modified-Since"] = cached["modified"]
+    return headers
+
+
+def _parse_response(url, content, headers):
+    """Build a cache record from a downloaded feed body."""
+    import feedparser
+    feed = feedparser.parse(content, response_headers={**headers, "content-location": url})
+    if feed.bozo and feed.bozo_exception:
+        print(f"      ⚠️ Feed warning for {url}: {feed.bozo_exception}")
+    return {
+        "url": url,
+        "etag": headers.get("etag"),
+        "modified": headers.get("last-modified"),
+        "fetched_at": time.time(),
+        "raw": content,
+        "entries": feed.entries,
+    }
+
+
+def _revalidated(url, cached):
+    """A 304 means our copy is still current; just bump its timestamp."""
+    cached["fetched_at"] = time.time()
+    _save_cached(url, cached)
+    return cached
+
+
+def _download(url, cached):
+    """GET the feed, sending validators from the cached copy so the server can answer 304."""
+    import httpx
+    with span("feed.download", url=url) as attrs:
+        resp = httpx.get(url, headers=_conditional_headers(cached), timeout=FEED_TIMEOUT, follow_redirects=True)
+        attrs.update(status=resp.status_code, bytes=len(resp.content))
+    if resp.status_code == 304 and cached:
+        return _revalidated(url, cached)
+    resp.raise_for_status()
+    with span("feed.parse", url=url, bytes=len(resp.content)):
+        record = _parse_response(url, resp.content, dict(resp.headers))
+    _save_cached(url, record)
+    return record
+
+
+def _fresh_entries(url, ttl):
+    """Entries from the run memo or an unexpired disk cache, plus the disk record for revalidation."""
+    if url in _feeds:
+        return _feeds[url], None
+    cached = _load_cached(url)
+    if cached and time.time() - cached.get("fetched_at", 0) < ttl:
+        return cached["entries"], cached
+    return None, cached
+
+
+def get_feed(url: str, ttl: int = FEED_TTL):
+    """Return all parsed entries for a feed, served from the feed cache when possible."""
+    with _feed_lock(url), span("feed.get", url=url) as attrs:
+        entries, cached = _fresh_entries(url, ttl)
+        attrs["cache"] = "hit" if entries is not None else "miss"
+        if entries is None:
+            try:
+                entries = _download(url, cached)["entries"]
+            except Exception as e:
+                print(f"      ⚠️ Feed error ({url}): {e}")
+                # Serve the stale copy rather than nothing
+                entries = cached["entries"] if cached else []
+
+        _feeds[url] = entries
+        return entries
+
+
+async def _download_async(client, host_limits, url, cached):
+    async with host_limits[urlsplit(url).netloc]:
+        with span("feed.download", url=url) as attrs:
+            resp = await client.get(url, headers=_conditional_headers(cached))
+            attrs.update(status=resp.status_code, bytes=len(resp.content))
+    if resp.status_code == 304 and cached:
+        return _revalidated(url, cached)
+    resp.raise_for_status()
+    with span("feed.parse", url=url, bytes=len(resp.content)):
+        record = _parse_response(url, resp.content, dict(resp.headers))
+    _save_cached(url, record)
+    return record
+
+
+async def _download_all(stale, deadline):
+    """Download every feed in `stale` at once; each gets `deadline` seconds."""
+    import httpx
+    hosts = {urlsplit(url).netloc for url in stale}
+    host_limits = {host: asyncio.Semaphore(FEED_HOST_CONNECTIONS) for host in hosts}
+    async with httpx.AsyncClient(http2=True, timeout=FEED_TIMEOUT, follow_redirects=True) as client:
+        tasks = [
+            asyncio.wait_for(_download_async(client, host_limits, url, cached), deadline)
+            for url, cached in stale.items()
+        ]
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+    return dict(zip(stale, results))
+
+
+def fetch_feeds(urls: list, limit: int = 5, deadline: float = FEED_DEADLINE, ttl: int = FEED_TTL):
+    """Fetch several feeds concurrently. Returns {url: top N entries}.
+
+    Feeds that miss the deadline fall back to their stale cached copy (or no entries),
+    so a slow host costs at most `deadline` seconds instead of holding up the section.
+    """
+    urls = list(dict.fromkeys(urls))
+    # Lock in a fixed order so concurrent sections wait on each other instead of double-fetching
+    locks = [_feed_lock(url) for url in sorted(urls)]
+    for lock in locks:
+        lock.acquire()
+    try:
+        with span("feed.fetch", feeds=len(urls)) as attrs:
+            stale = {}
+            for url in urls:
+                entries, cached = _fresh_entries(url, ttl)
+                if entries is None:
+                    stale[url] = cached
+                else:
+                    _feeds[url] = entries
+            attrs["downloads"] = len(stale)
+
+            if stale:
+                try:
+                    results = asyncio.run(_download_all(stale, deadline))
+                except Exception as e:
+                    results = {url: e for url in stale}
+                for url, result in results.items():
+                    if isinstance(result, BaseException):
+                        reason = "timed out" if isinstance(result, asyncio.TimeoutError) else result
+                        print(f"      ⚠️ Feed error ({url}): {reason}")
+                        cached = stale[url]
+                        _feeds[url] = cached["entries"] if cached else []
+                    else:
+                        _feeds[url] = result["entries"]
+
+            return {url: _feeds[url][:limit] for url in urls}
+    finally:
+        for lock in locks:
+            lock.release()
+
 
 def fetch_feed(url: str, limit: int = 5):
     """Fetch and return top N entries from an RSS feed."""
     try:
-        feed = feedparser.parse(url, agent=USER_AGENT)
-        if feed.bozo and feed.bozo_exception:
-            print(f"      ⚠️ Feed warning for {url}: {feed.bozo_exception}")
-        return feed.entries[:limit]
+        return get_feed(url)[:limit]
     except Exception as e:
         print(f"      ⚠️ Feed error ({url}): {e}")
         return []
@@ -18,8 +210,12 @@ def fetch_feed(url: str, limit: int = 5):
 def fetch_headlines(urls: list, limit_per_feed: int = 5):
     """Fetch headlines from multiple RSS URLs. Returns a newline-joined string."""
     headlines = []
-    for url in urls:
-        entries = fetch_feed(url, limit_per_feed)
+    for entries in fetch_feeds(urls, limit_per_feed).values():
         for entry in entries:
             headlines.append(f"- {entry.title}")
     return "\n".join(headlines)
+
+
+def entry_key(entry) -> list:
+    """What identifies an entry for input fingerprints: its ID (or link) and title."""
+    return [entry.get("id") or entry.get("link"), (entry.get("title") or "").strip()]
@@ -0,0 +1,172 @@
+"""
+Lease-based partitions for sharded newsletter sends.
+The subscriber collection is split into N shards by range of `emailKey`, the normalized
+(trimmed, lowercased) address written at sign-up, so each shard reads only its own
+subscriber documents and duplicate sign-ups of one address, whatever their case, land
+in the same shard (where they are deduplicated). A worker claims
+a shard by taking its lease, renews the lease while it sends, and releases it with its
+counts. A worker that dies simply stops renewing: once the lease expires another worker
+(on this machine or another runner) claims the shard, and the delivery ledger skips
+whatever was already sent.
+
+Uses the same backend as the ledger (KSJ_LEDGER): Firestore documents under
+newsletter_deliveries/<edition>/shards, or a table in the local SQLite ledger file.
+"""
+import json
+import os
+import sqlite3
+import time
+
+from app.ledger import LEDGER_BACKEND, LEDGER_COLLECTION, LEDGER_PATH
+
+LEASE_SECONDS = int(os.getenv("KSJ_SHARD_LEASE", "60"))
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+
+
+# Subscriber field the shards are ranged over
+SHARD_KEY_FIELD = "emailKey"
+
+# Range bounds are two-letter prefixes spread evenly over a-z. The first and last ranges
+# are open, so keys starting with a digit or punctuation are still covered.
+KEY_ALPHABET = "abcdefghijklmnopqrstuvwxyz"
+
+
+def email_range(shard: int, shards: int) -> tuple:
+    """(start, end) of the shard's email keys: start inclusive, end exclusive, None for open."""
+    def bound(i):
+        slot = i * len(KEY_ALPHABET) ** 2 // shards
+        return KEY_ALPHABET[slot // len(KEY_ALPHABET)] + KEY_ALPHABET[slot % len(KEY_ALPHABET)]
+
+    return (bound(shard) if shard else None, bound(shard + 1) if shard + 1 < shards else None)
+
+
+class _Leases:
+    """Lease protocol; backends provide _update(shard, change) and status()."""
+
+    shards = 1
+
+    def _update(self, shard, change):
+        """Atomically apply change(current fields) -> new fields, or None to leave the shard alone."""
+        raise NotImplementedError
+
+    def status(self) -> dict:
+        """shard index -> stored fields (status, owner, leaseExpires, delivered, failed)."""
+        raise NotImplementedError
+
+    def claim(self, worker: str):
+        """Take the lease on the first shard that is neither done nor leased. Returns its index or None."""
+        for shard in range(self.shards):
+            if self._update(shard, lambda data: _claimed(data, worker)):
+                return shard
+        return None
+
+    def renew(self, shard: int, worker: str) -> bool:
+        """Extend our lease. False means another worker has taken the shard over."""
+        return self._update(shard, lambda data: _renewed(data, worker))
+
+    def release(self, shard: int, worker: str, delivered: int, failed: int, done: bool):
+        self._update(shard, lambda data: _released(data, worker, delivered, failed, done))
+
+
+class FirestoreLeases(_Leases):
+    def __init__(self, edition_id: str, shards: int):
+        from app.db import get_firestore
+        from firebase_admin import firestore
+        self.shards = shards
+        self._db = get_firestore()
+        self._transactional = firestore.transactional
+        self._col = self._db.collection(LEDGER_COLLECTION).document(edition_id).collection("shards")
+
+    def _update(self, shard, change):
+        ref = self._col.document(str(shard))
+
+        @self._transactional
+        def apply(transaction):
+            snap = ref.get(transaction=transaction)
+            fields = change(snap.to_dict() or {} if snap.exists else {})
+            if fields is None:
+                return False
+            transaction.set(ref, fields, merge=True)
+            return True
+
+        return apply(self._db.transaction())
+
+    def status(self) -> dict:
+        return {int(doc.id): doc.to_dict() or {} for doc in self._col.stream()}
+
+
+class SQLiteLeases(_Leases):
+    """Same lease protocol on a local SQLite table, for a process pool on one machine."""
+
+    def __init__(self, edition_id: str, shards: int, path: str = LEDGER_PATH):
+        self.shards = shards
+        self.edition_id = edition_id
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS shards ("
+            " edition TEXT NOT NULL, shard INTEGER NOT NULL, data TEXT NOT NULL,"
+            " PRIMARY KEY (edition, shard)) WITHOUT ROWID"
+        )
+
+    def _update(self, shard, change):
+        conn = self._conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT data FROM shards WHERE edition = ? AND shard = ?",
+                               (self.edition_id, shard)).fetchone()
+            data = json.loads(row[0]) if row else {}
+            fields = change(data)
+            if fields is not None:
+                conn.execute("INSERT OR REPLACE INTO shards (edition, shard, data) VALUES (?, ?, ?)",
+                             (self.edition_id, shard, json.dumps({**data, **fields})))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return fields is not None
+
+    def status(self) -> dict:
+        rows = self._conn.execute("SELECT shard, data FROM shards WHERE edition = ?", (self.edition_id,))
+        return {shard: json.loads(data) for shard, data in rows}
+
+
+# --- Lease transitions (shared by both backends) ---
+
+def _claimed(data, worker):
+    if data.get("status") == DONE:
+        return None
+    if data.get("owner") and data.get("leaseExpires", 0) > time.time():
+        return None
+    return {"status": RUNNING, "owner": worker, "leaseExpires": time.time() + LEASE_SECONDS}
+
+
+def _renewed(data, worker):
+    if data.get("owner") != worker or data.get("status") != RUNNING:
+        return None
+    return {"leaseExpires": time.time() + LEASE_SECONDS}
+
+
+def _released(data, worker, delivered, failed, done):
+    # Counts accumulate across attempts, so a shard taken over midway still reports everything
+    fields = {"delivered": data.get("delivered", 0) + delivered, "failed": data.get("failed", 0) + failed}
+    if data.get("owner") == worker:
+        fields.update(status=DONE if done else PENDING, owner=None, leaseExpires=0)
+    return fields
+
+
+def all_done(status: dict, shards: int) -> bool:
+    return all(status.get(shard, {}).get("status") == DONE for shard in range(shards))
+
+
+def open_leases(edition_id: str, shards: int, backend: str = None):
+    backend = backend or LEDGER_BACKEND
+    if backend == "firestore":
+        return FirestoreLeases(edition_id, shards)
+    if backend == "sqlite":
+        return SQLiteLeases(edition_id, shards)
+    raise ValueError(f"Sharded sends need a shared ledger backend, not KSJ_LEDGER={backend}")
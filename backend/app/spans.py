@@ -0,0 +1,133 @@
+"""
+Lightweight timing spans.
+
+    with span("llm.generate", prompt_chars=len(prompt)) as attrs:
+        ...
+        attrs["cache"] = "hit"
+
+Spans nest: each records its parent and the pipeline task it ran under. Work handed
+to a thread pool keeps its parent when the callable is wrapped with bind(). Finished
+spans are kept in memory for the publish report's per-phase breakdown and appended
+as JSON lines to KSJ_SPANS_LOG ("off" disables the file).
+
+The phase is the part of the name before the first dot: feed, llm, image, db, task.
+"""
+import contextvars
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SPANS_LOG = os.getenv("KSJ_SPANS_LOG", os.path.join(BASE_DIR, ".cache", "spans.jsonl"))
+SPANS_LOG_MAX_BYTES = int(os.getenv("KSJ_SPANS_LOG_MB", "20")) * 1024 * 1024
+
+RUN_ID = f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}"
+
+_current = contextvars.ContextVar("ksj_span", default=None)  # (span id, task, phase) of the open span
+_ids = itertools.count(1)
+_records = []
+_lock = threading.Lock()
+_log = None
+
+
+def phase_of(name: str) -> str:
+    return name.split(".", 1)[0]
+
+
+def _open_log():
+    """Append handle for the JSON lines file; the previous file is rotated to .1 once it gets large."""
+    global _log
+    if _log is None and SPANS_LOG != "off":
+        try:
+            os.makedirs(os.path.dirname(SPANS_LOG), exist_ok=True)
+            if os.path.exists(SPANS_LOG) and os.path.getsize(SPANS_LOG) > SPANS_LOG_MAX_BYTES:
+                os.replace(SPANS_LOG, SPANS_LOG + ".1")
+            _log = open(SPANS_LOG, "a", encoding="utf-8")
+        except OSError as e:
+            print(f"⚠️ Could not open span log {SPANS_LOG}: {e}")
+            _log = False
+    return _log
+
+
+def _emit(record):
+    with _lock:
+        _records.append(record)
+        log = _open_log()
+        if log:
+            log.write(json.dumps(record, default=str) + "\n")
+            log.flush()
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Time the block as one span. Yields its attribute dict, which the block may add to."""
+    parent = _current.get()
+    task = attrs.pop("task", None) or (parent[1] if parent else None)
+    span_id = next(_ids)
+    token = _current.set((span_id, task, phase_of(name)))
+    started_at, start = time.time(), time.perf_counter()
+    error = None
+    try:
+        yield attrs
+    except Exception as e:
+        error = type(e).__name__
+        raise
+    finally:
+        _current.reset(token)
+        record = {
+            "run": RUN_ID,
+            "id": span_id,
+            "parent": parent[0] if parent else None,
+            "parentPhase": parent[2] if parent else None,
+            "task": task,
+            "name": name,
+            "start": round(started_at, 6),
+            "duration": round(time.perf_counter() - start, 6),
+            "thread": threading.current_thread().name,
+            **attrs,
+        }
+        if error:
+            record["error"] = error
+        _emit(record)
+
+
+def bind(fn):
+    """Wrap fn so it runs under the caller's open span, e.g. when submitted to a thread pool."""
+    context = contextvars.copy_context()
+    # A context can only be entered by one thread at a time, so each call gets its own copy
+    return lambda *args, **kwargs: context.copy().run(fn, *args, **kwargs)
+
+
+def mark() -> int:
+    """Position in the span record; pass to breakdown(since=...) to look at later spans only."""
+    with _lock:
+        return len(_records)
+
+
+def breakdown(since: int = 0) -> dict:
+    """task -> phase -> {"seconds", "count"} for spans finished after `since`.
+
+    Only the outermost span of each phase is counted, so a retry nested in a call
+    isn't counted twice. Seconds are busy time: concurrent spans add up.
+    """
+    with _lock:
+        records = _records[since:]
+    totals = {}
+    for record in records:
+        phase = phase_of(record["name"])
+        if phase == "task" or record["parentPhase"] == phase:
+            continue
+        entry = totals.setdefault(record["task"], {}).setdefault(phase, {"seconds": 0.0, "count": 0})
+        entry["seconds"] += record["duration"]
+        entry["count"] += 1
+    return totals
+
+
+def format_phases(phases: dict) -> str:
+    """'feed 0.81s (2) · llm 12.10s (1)' for one task's breakdown."""
+    return " · ".join(f"{phase} {entry['seconds']:.2f}s ({entry['count']})"
+                      for phase, entry in sorted(phases.items(), key=lambda kv: -kv[1]["seconds"])) or "-"
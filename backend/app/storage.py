@@ -0,0 +1,307 @@
+"""
+Document storage behind app.db.
+A small interface over documents addressed as "collection/doc" paths (subcollections
+nest: "newsletter_deliveries/2026-01-05/chunks/abc"): get, get_many, set, an atomic
+batched write and ordered collection streaming.
+
+Backends (KSJ_STORAGE): "firestore" (default, production), "memory" (per-process,
+zero latency, for profiling and load tests) or "sqlite" (local file at
+KSJ_STORAGE_PATH, shared by processes on one machine, for running the pipeline on
+a laptop).
+"""
+import copy
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+
+from app.spans import span
+
+load_dotenv()
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STORAGE_BACKEND = os.getenv("KSJ_STORAGE", "firestore")
+STORAGE_PATH = os.getenv("KSJ_STORAGE_PATH", os.path.join(BASE_DIR, ".cache", "storage.sqlite3"))
+STREAM_PAGE_SIZE = 500
+
+
+class _ServerTimestamp:
+    def __repr__(self):
+        return "SERVER_TIMESTAMP"
+
+
+# Replaced by the commit time when written (Firestore's own sentinel on that backend)
+SERVER_TIMESTAMP = _ServerTimestamp()
+
+
+def _resolve(value, replacement):
+    """Copy of value with every SERVER_TIMESTAMP replaced."""
+    if value is SERVER_TIMESTAMP:
+        return replacement
+    if isinstance(value, dict):
+        return {k: _resolve(v, replacement) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_resolve(v, replacement) for v in value]
+    return copy.copy(value)
+
+
+def _merged(doc, data, merge):
+    """Apply a set() to an existing document: replace it, or merge only the given field paths."""
+    if not merge:
+        return data
+    doc = copy.deepcopy(doc or {})
+    for field in (merge if isinstance(merge, list) else list(data)):
+        *parents, leaf = field.split(".")
+        src, dst = data, doc
+        for part in parents:
+            src = src[part]
+            if not isinstance(dst.get(part), dict):
+                dst[part] = {}
+            dst = dst[part]
+        dst[leaf] = src[leaf]
+    return doc
+
+
+def _split(path):
+    collection, _, doc_id = path.rpartition("/")
+    return collection, doc_id
+
+
+class Storage:
+    """Interface every backend implements.
+
+    set()/write() take merge=None (replace the document), True (merge top-level fields)
+    or a list of dotted field paths to replace, like Firestore's set(merge=...).
+    """
+
+    def get(self, path: str):
+        """The document's fields, or None if it doesn't exist."""
+        return self.get_many([path])[path]
+
+    def get_many(self, paths: list) -> dict:
+        """path -> fields (or None) for several documents in one round trip."""
+        raise NotImplementedError
+
+    def set(self, path: str, data: dict, merge=None):
+        self.write([(path, data, merge)])
+
+    def write(self, writes: list):
+        """Apply [(path, data, merge), ...] atomically."""
+        raise NotImplementedError
+
+    def stream(self, collection: str, fields: list = None, page_size: int = STREAM_PAGE_SIZE,
+               order_by: str = None, start=None, end=None):
+        """Yield (doc_id, fields) for the collection's documents page by page.
+
+        `fields` limits what is read (every field if None). Documents come in document-ID
+        order, or ordered by the `order_by` field (documents without it are left out).
+        `start` (inclusive) and `end` (exclusive) bound that key, so a slice of the
+        collection costs only its own reads.
+        """
+        after = None
+        while True:
+            with span("db.read", collection=collection) as attrs:
+                page = self._page(collection, fields, page_size, after, order_by, start, end)
+                attrs["docs"] = len(page)
+            yield from ((doc_id, data) for doc_id, data, _ in page)
+            if len(page) < page_size:
+                return
+            doc_id, _, key = page[-1]
+            after = (key, doc_id)
+
+    def _page(self, collection, fields, limit, after, order_by, start, end):
+        """Up to `limit` (doc_id, fields, sort key) rows, sorted by (key, doc_id) and past `after`."""
+        raise NotImplementedError
+
+
+class FirestoreStorage(Storage):
+    def __init__(self, client):
+        from firebase_admin import firestore
+        self.client = client
+        self._firestore = firestore
+
+    def _ref(self, path):
+        return self.client.document(path)
+
+    def get_many(self, paths: list) -> dict:
+        refs = [self._ref(path) for path in paths]
+        by_path = {snap.reference.path: snap for snap in self.client.get_all(refs)}
+        return {path: (by_path[ref.path].to_dict() if ref.path in by_path and by_path[ref.path].exists else None)
+                for path, ref in zip(paths, refs)}
+
+    def write(self, writes: list):
+        batch = self.client.batch()
+        for path, data, merge in writes:
+            data = _resolve(data, self._firestore.SERVER_TIMESTAMP)
+            batch.set(self._ref(path), data, merge=merge or False)
+        batch.commit()
+
+    def stream(self, collection: str, fields: list = None, page_size: int = STREAM_PAGE_SIZE,
+               order_by: str = None, start=None, end=None):
+        # Firestore pages by snapshot cursor, so it keeps the last snapshot rather than an ID
+        query = self.client.collection(collection)
+        key = order_by or self._firestore.FieldPath.document_id()
+        # Document-ID bounds are compared as references
+        bound = (lambda value: value) if order_by else self.client.collection(collection).document
+        if start is not None:
+            query = query.where(filter=self._firestore.FieldFilter(key, ">=", bound(start)))
+        if end is not None:
+            query = query.where(filter=self._firestore.FieldFilter(key, "<", bound(end)))
+        if fields:
+            query = query.select(fields)
+        query = query.order_by(key).limit(page_size)
+        last_doc = None
+        while True:
+            page = query.start_after(last_doc) if last_doc else query
+            with span("db.read", collection=collection) as attrs:
+                docs = list(page.stream())
+                attrs["docs"] = len(docs)
+            for doc in docs:
+                yield doc.id, doc.to_dict() or {}
+            if len(docs) < page_size:
+                return
+            last_doc = docs[-1]
+
+
+class MemoryStorage(Storage):
+    """Dicts in this process only: nothing persists and other processes can't see it."""
+
+    def __init__(self):
+        self._docs = {}
+        self._lock = threading.Lock()
+
+    def get_many(self, paths: list) -> dict:
+        with self._lock:
+            return {path: copy.deepcopy(self._docs.get(path)) for path in paths}
+
+    def write(self, writes: list):
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            for path, data, merge in writes:
+                self._docs[path] = _merged(self._docs.get(path), _resolve(data, now), merge)
+
+    def stream(self, collection: str, fields: list = None, page_size: int = STREAM_PAGE_SIZE,
+               order_by: str = None, start=None, end=None):
+        # The collection is sorted once per stream, not once per page
+        prefix = collection + "/"
+        with self._lock:
+            keyed = []
+            for path, doc in self._docs.items():
+                doc_id = path[len(prefix):]
+                if not path.startswith(prefix) or "/" in doc_id:
+                    continue
+                key = doc.get(order_by) if order_by else doc_id
+                if key is not None and _in_range(key, start, end):
+                    keyed.append((key, doc_id))
+        # Keys of different types sort by type first, as in Firestore
+        ids = [doc_id for _, doc_id in sorted(keyed, key=lambda kv: (type(kv[0]).__name__, kv))]
+        for offset in range(0, len(ids) + 1, page_size):
+            with span("db.read", collection=collection) as attrs:
+                with self._lock:
+                    page = [(i, _select(self._docs[prefix + i], fields)) for i in ids[offset:offset + page_size]]
+                attrs["docs"] = len(page)
+            yield from page
+            if len(page) < page_size:
+                return
+
+
+def _in_range(key, start, end):
+    try:
+        return (start is None or key >= start) and (end is None or key < end)
+    except TypeError:  # a value of another type than the bounds, which never matches a range
+        return False
+
+
+def _select(data, fields):
+    data = copy.deepcopy(data)
+    return {k: v for k, v in data.items() if k in fields} if fields else data
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    raise TypeError(f"Cannot store {type(value).__name__}")
+
+
+def _decode(obj):
+    if len(obj) == 1 and "__datetime__" in obj:
+        return datetime.fromisoformat(obj["__datetime__"])
+    return obj
+
+
+class SQLiteStorage(Storage):
+    """One JSON row per document in a local SQLite file."""
+
+    def __init__(self, path: str = STORAGE_PATH):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            " collection TEXT NOT NULL, id TEXT NOT NULL, data TEXT NOT NULL,"
+            " PRIMARY KEY (collection, id)) WITHOUT ROWID"
+        )
+
+    def _read(self, path):
+        collection, doc_id = _split(path)
+        row = self._conn.execute("SELECT data FROM documents WHERE collection = ? AND id = ?",
+                                 (collection, doc_id)).fetchone()
+        return json.loads(row[0], object_hook=_decode) if row else None
+
+    def get_many(self, paths: list) -> dict:
+        with self._lock:
+            return {path: self._read(path) for path in paths}
+
+    def write(self, writes: list):
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            conn = self._conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for path, data, merge in writes:
+                    doc = _merged(self._read(path) if merge else None, _resolve(data, now), merge)
+                    conn.execute("INSERT OR REPLACE INTO documents (collection, id, data) VALUES (?, ?, ?)",
+                                 (*_split(path), json.dumps(doc, default=_encode)))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def _page(self, collection, fields, limit, after, order_by, start, end):
+        key = "json_extract(data, ?)" if order_by else "id"
+        key_args = [f'$."{order_by}"'] if order_by else []
+        where, args = ["collection = ?", f"{key} IS NOT NULL"], [collection, *key_args]
+        if start is not None:
+            where.append(f"{key} >= ?")
+            args += [*key_args, start]
+        if end is not None:
+            where.append(f"{key} < ?")
+            args += [*key_args, end]
+        if after is not None:
+            where.append(f"({key}, id) > (?, ?)")
+            args += [*key_args, *after]
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, data, {key} FROM documents WHERE {' AND '.join(where)} ORDER BY {key}, id LIMIT ?",
+                [*key_args, *args, *key_args, limit],
+            ).fetchall()
+        return [(doc_id, _select(json.loads(data, object_hook=_decode), fields), sort_key)
+                for doc_id, data, sort_key in rows]
+
+
+def open_storage(backend: str = None, firestore_client=None) -> Storage:
+    """Storage for the configured backend. The Firestore backend needs an initialized client."""
+    backend = backend or STORAGE_BACKEND
+    if backend == "firestore":
+        return FirestoreStorage(firestore_client)
+    if backend == "memory":
+        return MemoryStorage()
+    if backend == "sqlite":
+        return SQLiteStorage()
+    raise ValueError(f"Unknown KSJ_STORAGE backend: {backend}")
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark: import time of every task and app module in a fresh interpreter.
+Each module is imported with `python -X importtime` (median of --repeat runs) and
+reported with its heaviest dependencies. Every task and /api/run-daily call starts a
+new interpreter, so this is paid on every run. --budget-ms fails (exit 1) if any
+module is slower, to keep heavy SDK imports from creeping back to module level.
+Usage: python bench/bench_import.py --repeat 5 --budget-ms 400 --json imports.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TASKS_DIR = os.path.join(BACKEND_DIR, "tasks")
+
+MODULES = [
+    "app.db", "app.genai_engine", "app.scraper", "app.image_utils", "app.market_data",
+    "app.mailer", "app.newsletter",
+    "pipeline", "update_ticker", "update_whats_news", "update_hero_story", "update_featured_stories",
+    "update_opinions", "update_deep_dive", "update_global_briefing", "update_campus_news", "send_newsletter",
+]
+
+
+def import_once(module):
+    """Returns (wall seconds for the whole interpreter, {imported name: cumulative µs})."""
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join([BACKEND_DIR, TASKS_DIR]), "KSJ_SPANS_LOG": "off"}
+    start = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                          cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    if proc.returncode:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr.strip().splitlines()[-1]}")
+    cumulative = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cum, name = line[len("import time:"):].split("|")
+        name = name.strip()
+        cumulative[name] = max(cumulative.get(name, 0), int(cum))
+    return wall, cumulative
+
+
+def measure(module, repeat, top):
+    walls, totals, deps = [], [], {}
+    for _ in range(repeat):
+        wall, cumulative = import_once(module)
+        walls.append(wall)
+        totals.append(cumulative.get(module, 0))
+        for name, us in cumulative.items():
+            deps.setdefault(name, []).append(us)
+    # Heaviest third-party packages pulled in (our own modules are listed separately)
+    heavy = sorted(((name, statistics.median(us)) for name, us in deps.items()
+                    if "." not in name and name != module and not name.startswith(("app", "update_"))),
+                   key=lambda kv: -kv[1])[:top]
+    return {
+        "import_ms": round(statistics.median(totals) / 1000, 1),
+        "interpreter_ms": round(statistics.median(walls) * 1000, 1),
+        "heaviest": {name: round(us / 1000, 1) for name, us in heavy},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("modules", nargs="*", default=MODULES)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=3, help="heaviest dependencies shown per module")
+    parser.add_argument("--budget-ms", type=float, default=None, help="fail if any module's import exceeds this")
+    parser.add_argument("--json", metavar="PATH", help="save results as JSON")
+    args = parser.parse_args()
+
+    baseline = statistics.median(import_once("sys")[0] for _ in range(args.repeat)) * 1000
+    print(f"bare interpreter: {baseline:.0f}ms\n")
+    print(f"{'module':<26} {'import':>8} {'process':>8}  heaviest dependencies")
+    results, over = {}, []
+    for module in args.modules:
+        result = results[module] = measure(module, args.repeat, args.top)
+        heavy = ", ".join(f"{name} {ms:.0f}ms" for name, ms in result["heaviest"].items())
+        flag = ""
+        if args.budget_ms is not None and result["import_ms"] > args.budget_ms:
+            over.append(module)
+            flag = "  ❌ over budget"
+        print(f"{module:<26} {result['import_ms']:>6.0f}ms {result['interpreter_ms']:>6.0f}ms  {heavy}{flag}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"python": sys.version.split()[0], "interpreter_ms": round(baseline, 1), "modules": results},
+                      f, indent=2)
+        print(f"\n💾 Saved results to {args.json}")
+    if over:
+        print(f"\n❌ {len(over)} module(s) over the {args.budget_ms:.0f}ms import budget: {', '.join(over)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Newsletter delivery benchmark.
+Runs app.mailer.deliver against a local stand-in for Resend's /emails/batch endpoint
+with configurable latency, transient error rate and invalid addresses.
+Usage: python bench/bench_mailer.py --recipients 5000 --latency-ms 150 --rps 10
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def make_handler(latency, error_rate, stats):
+    class StandInResend(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("content-length", 0))) or b"[]")
+            time.sleep(latency)
+            with stats["lock"]:
+                stats["calls"] += 1
+            if random.random() < error_rate:
+                return self._reply(429, {"statusCode": 429, "name": "rate_limit_exceeded", "message": "Too many requests"})
+            errors = [{"index": i, "message": "Invalid `to` field"} for i, m in enumerate(body) if "invalid" in m["to"][0]]
+            bad = {e["index"] for e in errors}
+            data = [{"id": str(uuid.uuid4())} for i in range(len(body)) if i not in bad]
+            self._reply(200, {"data": data, "errors": errors})
+
+        def _reply(self, status, payload):
+            raw = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(raw)))
+            self.end_headers()
+            self.wfile.write(raw)
+
+        def log_message(self, *args):
+            pass
+
+    return StandInResend
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--recipients", type=int, default=2000)
+    parser.add_argument("--latency-ms", type=float, default=150)
+    parser.add_argument("--error-rate", type=float, default=0.02, help="fraction of batch calls answered with 429")
+    parser.add_argument("--invalid", type=int, default=5, help="number of invalid addresses mixed in")
+    parser.add_argument("--rps", type=float, default=None, help="override KSJ_MAIL_RPS")
+    parser.add_argument("--concurrency", type=int, default=None, help="override KSJ_MAIL_CONCURRENCY")
+    args = parser.parse_args()
+
+    import resend
+    from app import mailer
+
+    if args.rps:
+        mailer.REQUESTS_PER_SECOND = args.rps
+    if args.concurrency:
+        mailer.MAX_CONCURRENCY = args.concurrency
+    mailer.RETRY_BASE_DELAY = 0.2
+
+    stats = {"calls": 0, "lock": threading.Lock()}
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(args.latency_ms / 1000, args.error_rate, stats))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    resend.api_url = f"http://127.0.0.1:{server.server_port}"
+    resend.api_key = "re_benchmark"
+
+    recipients = [f"reader{i}@example.com" for i in range(args.recipients)]
+    for i in random.sample(range(args.recipients), min(args.invalid, args.recipients)):
+        recipients[i] = f"invalid{i}@"
+
+    def make_message(email):
+        return {"from": "bench@theksj.com", "to": [email], "subject": "Benchmark", "html": "<p>hi</p>"}
+
+    report = mailer.deliver(recipients, make_message)
+    server.shutdown()
+
+    print(f"recipients:   {args.recipients}")
+    print(f"delivered:    {report['delivered']}")
+    print(f"failed:       {report['failed']}")
+    print(f"batch calls:  {stats['calls']} ({report['batches']} batches)")
+    print(f"elapsed:      {report['elapsed']:.2f}s")
+    print(f"throughput:   {report['per_second']:.1f} msg/s")
+
+
+if __name__ == "__main__":
+    main()
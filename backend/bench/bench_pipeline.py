@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Offline end-to-end pipeline benchmark.
+Replays fixture RSS feeds from a local server through every update_*.py task and
+send_newsletter, with a fake Gemini model (configurable latency), the in-memory
+storage backend, a fake yfinance and a fake Resend batch endpoint. Reports wall time,
+CPU time, peak RSS growth and call counts per stage (the process peak for the total); --json saves the results so two
+commits can be compared with --compare.
+Usage: python bench/bench_pipeline.py --feeds 8 --entries 20 --subscribers 5000 --llm-latency-ms 800 --json before.json
+"""
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TASKS_DIR = os.path.join(BACKEND_DIR, "tasks")
+sys.path[1:1] = [BACKEND_DIR, TASKS_DIR]
+
+STAGE_ORDER = ["ticker", "whats_news", "hero_story", "featured_stories", "opinions",
+               "deep_dive", "global_briefing", "campus_news", "newsletter"]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--feeds", type=int, default=6, help="fixture feeds per feed list")
+    parser.add_argument("--entries", type=int, default=20, help="entries per fixture feed")
+    parser.add_argument("--subscribers", type=int, default=2000)
+    parser.add_argument("--llm-latency-ms", type=float, default=500)
+    parser.add_argument("--feed-latency-ms", type=float, default=50)
+    parser.add_argument("--market-latency-ms", type=float, default=200)
+    parser.add_argument("--resend-latency-ms", type=float, default=100)
+    parser.add_argument("--mail-rps", type=float, default=50, help="KSJ_MAIL_RPS for the fake Resend account")
+    parser.add_argument("--mode", choices=["stages", "pipeline"], default="stages",
+                        help="stages: run each task alone, in order; pipeline: one run_pipeline() over all tasks")
+    parser.add_argument("--warm", action="store_true", help="run twice and report the second run (warm caches)")
+    parser.add_argument("--json", metavar="PATH", help="save results as JSON")
+    parser.add_argument("--compare", metavar="OLD_JSON", help="print deltas against an earlier --json result")
+    parser.add_argument("--verbose", action="store_true", help="show task output")
+    return parser.parse_args()
+
+
+def configure_env(args, workdir):
+    """Point every cache at a scratch directory and set the keys the tasks require, before app imports."""
+    os.environ.update({
+        "GEMINI_API_KEY": "bench",
+        "RESEND_API_KEY": "bench",
+        "KSJ_FEED_CACHE_DIR": os.path.join(workdir, "feeds"),
+        "KSJ_IMAGE_CACHE": os.path.join(workdir, "images.json"),
+        "KSJ_MARKET_DIR": os.path.join(workdir, "market"),
+        "KSJ_GENAI_CACHE_DIR": os.path.join(workdir, "genai"),
+        "KSJ_GENAI_LATENCY": os.path.join(workdir, "genai_latency.json"),
+        "KSJ_SPANS_LOG": os.path.join(workdir, "spans.jsonl"),
+        "KSJ_STORAGE": "memory",
+        "KSJ_LEDGER": "sqlite",
+        "KSJ_LEDGER_PATH": os.path.join(workdir, "ledger.sqlite3"),
+        "KSJ_MAIL_RPS": str(args.mail_rps),
+        # The fake model never rate-limits, so don't let the client-side limiter dominate
+        "KSJ_GEMINI_RPM": "100000",
+    })
+
+
+def install_fakes(args, counters):
+    """Swap the external services for fakes. Returns the fixture server."""
+    from fakes import FakeGeminiModel, FakeResendBatch, FakeYFinance, FixtureServer
+    from app import genai_engine, market_history
+    import resend
+    genai_engine.model = FakeGeminiModel(counters, args.llm_latency_ms / 1000)
+    market_history.yf = FakeYFinance(counters, args.market_latency_ms / 1000)
+    resend.Batch.send = FakeResendBatch(counters, args.resend_latency_ms / 1000).send
+
+    server = FixtureServer(counters, entries=args.entries, latency=args.feed_latency_ms / 1000)
+    point_feeds_at(server, args.feeds)
+    seed_subscribers(args.subscribers)
+    return server
+
+
+def point_feeds_at(server, n):
+    """Replace every task's feed list with fixture feeds (disjoint ranges, like the real lists)."""
+    import update_campus_news, update_featured_stories, update_global_briefing
+    import update_hero_story, update_opinions, update_whats_news
+    pool = [server.feed_url(i) for i in range(3 * n)]
+    update_whats_news.FEEDS = {"business": pool[:n], "world": pool[n:2 * n]}
+    update_hero_story.RSS_URL = pool[0]
+    update_featured_stories.FEEDS = pool[:n]
+    update_opinions.HEADLINE_FEEDS = pool[:n]
+    update_global_briefing.RSS_URLS = pool[n:2 * n]
+    update_campus_news.RSS_URLS = pool[2 * n:3 * n]
+
+
+def seed_subscribers(n):
+    from app.db import get_storage
+    profiles = [None, ["whats_news", "hero", "featured"], ["ticker", "deep_dive"], ["campus", "opinions"]]
+    docs = []
+    for i in range(n):
+        doc = {"email": f"Reader{i}@Example.com"}
+        if i % 3:
+            doc["name"] = f"Reader {i}"
+        if profiles[i % 4]:
+            doc["sections"] = profiles[i % 4]
+        docs.append((f"subscribers/sub{i:08d}", doc, None))
+    get_storage().write(docs)
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+
+
+def measure(name, fn, counters, verbose):
+    """Run one stage and return its timings, peak RSS growth and call-count deltas.
+
+    ru_maxrss is a high-water mark for the whole process, so a stage is charged only for
+    raising it: a stage that stays under an earlier stage's peak shows 0.
+    """
+    from app import genai_engine, spans
+    before_counts, before_cache = counters.snapshot(), genai_engine.cache_stats()
+    before_rss = peak_rss_mb()
+    spans_start = spans.mark()
+    start_wall, start_cpu = time.perf_counter(), time.process_time()
+    success = True
+    sink = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    with sink:
+        try:
+            fn()
+        except SystemExit as e:
+            success = e.code in (None, 0)
+        except Exception as e:
+            print(f"❌ {name}: {e}", file=sys.stderr)
+            success = False
+    wall, cpu = time.perf_counter() - start_wall, time.process_time() - start_cpu
+
+    after_counts, after_cache = counters.snapshot(), genai_engine.cache_stats()
+    calls = {k: v - before_counts.get(k, 0) for k, v in after_counts.items() if v != before_counts.get(k, 0)}
+    for field in ("hits", "misses"):
+        if after_cache[field] != before_cache[field]:
+            calls[f"genai_cache_{field}"] = after_cache[field] - before_cache[field]
+    phases = {}
+    for by_phase in spans.breakdown(since=spans_start).values():
+        for phase, entry in by_phase.items():
+            total = phases.setdefault(phase, {"seconds": 0.0, "count": 0})
+            total["seconds"] = round(total["seconds"] + entry["seconds"], 4)
+            total["count"] += entry["count"]
+    return {"ok": success, "wall_s": round(wall, 4), "cpu_s": round(cpu, 4),
+            "rss_growth_mb": round(peak_rss_mb() - before_rss, 1), "calls": calls, "phases": phases}
+
+
+def stage_runners(mode):
+    """(stage name, callable) pairs for the selected mode."""
+    import pipeline
+    if mode == "pipeline":
+        return [("pipeline", lambda: pipeline.run_pipeline(STAGE_ORDER, "BENCHMARK", "BENCHMARK REPORT"))]
+
+    def runner(key):
+        module_name, func_name = pipeline.TASKS[key][1], pipeline.TASKS[key][2]
+        return lambda: getattr(importlib.import_module(module_name), func_name)()
+
+    return [(key, runner(key)) for key in STAGE_ORDER]
+
+
+def reset_run_state():
+    """Forget the previous run's in-process memo and deliveries, keeping the on-disk caches (for --warm)."""
+    from app import db, scraper
+    from app.ledger import LEDGER_PATH
+    scraper._feeds.clear()
+    db._previous = None
+    os.remove(LEDGER_PATH)  # otherwise the second send resumes and skips every subscriber
+
+
+def run_once(args, counters):
+    stages = {}
+    for name, fn in stage_runners(args.mode):
+        stages[name] = measure(name, fn, counters, args.verbose)
+    total = {"wall_s": round(sum(s["wall_s"] for s in stages.values()), 4),
+             "cpu_s": round(sum(s["cpu_s"] for s in stages.values()), 4),
+             "peak_rss_mb": round(peak_rss_mb(), 1)}
+    return stages, total
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def format_calls(calls):
+    return ", ".join(f"{k}={v}" for k, v in sorted(calls.items())) or "-"
+
+
+def print_results(result):
+    # Stages show how much they raised the peak RSS; the total row is the process peak
+    print(f"{'stage':<18} {'ok':>3} {'wall':>8} {'cpu':>8} {'peak rss':>9}  calls")
+    for name, stage in result["stages"].items():
+        print(f"{name:<18} {'yes' if stage['ok'] else 'NO':>3} {stage['wall_s']:>7.2f}s {stage['cpu_s']:>7.2f}s "
+              f"{'+' + format(stage['rss_growth_mb'], '.1f'):>7}MB  {format_calls(stage['calls'])}")
+    total = result["total"]
+    print(f"{'total':<18} {'':>3} {total['wall_s']:>7.2f}s {total['cpu_s']:>7.2f}s {total['peak_rss_mb']:>7.1f}MB")
+
+    from app.spans import format_phases
+    print(f"\n{'stage':<18} phases (busy seconds, call count)")
+    for name, stage in result["stages"].items():
+        print(f"{name:<18} {format_phases(stage['phases'])}")
+
+
+def print_comparison(old, new):
+    print(f"\nvs {old.get('commit') or 'baseline'} ({old.get('timestamp', '?')}):")
+    print(f"{'stage':<18} {'wall':>18} {'cpu':>18}")
+    rows = list(new["stages"].items()) + [("total", new["total"])]
+    for name, stage in rows:
+        before = old["total"] if name == "total" else old["stages"].get(name)
+        if not before:
+            continue
+        cells = []
+        for field in ("wall_s", "cpu_s"):
+            delta = stage[field] - before[field]
+            pct = f"{delta / before[field] * 100:+.0f}%" if before[field] else "n/a"
+            cells.append(f"{delta:+.2f}s ({pct})")
+        print(f"{name:<18} {cells[0]:>18} {cells[1]:>18}")
+    if old.get("params") != new.get("params"):
+        print("⚠️ Parameters differ between the two runs")
+
+
+def main():
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix="ksj-bench-")
+    configure_env(args, workdir)
+
+    from fakes import Counters
+    counters = Counters()
+    server = install_fakes(args, counters)
+    try:
+        stages, total = run_once(args, counters)
+        if args.warm:
+            reset_run_state()
+            stages, total = run_once(args, counters)
+    finally:
+        server.close()
+
+    params = {k: getattr(args, k) for k in ("feeds", "entries", "subscribers", "llm_latency_ms", "feed_latency_ms",
+                                            "market_latency_ms", "resend_latency_ms", "mail_rps", "mode", "warm")}
+    result = {"commit": git_commit(), "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+              "python": sys.version.split()[0], "params": params, "stages": stages, "total": total}
+    print_results(result)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"\n💾 Saved results to {args.json}")
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(json.load(f), result)
+    if not all(stage["ok"] for stage in stages.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
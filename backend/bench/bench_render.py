@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Newsletter rendering benchmark.
+Compares personalized rendering from the precompiled edition (CompiledEmail.render)
+against rebuilding the whole template for every recipient, on a fixture edition.
+Usage: python bench/bench_render.py --recipients 10000 100000 --baseline-sample 2000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.newsletter import BODY_SECTIONS, Subscriber, compile_email, format_size_report
+
+
+class FixtureEdition:
+    """Same shape as app.db.Edition, filled with realistic section sizes."""
+
+    def __init__(self):
+        para = "Markets weighed the latest central bank signals as yields edged higher. " * 4
+        self.ticker = {"items": [{"symbol": s, "price": "$101.25", "change": "+0.42%", "isUp": i % 2 == 0}
+                                 for i, s in enumerate(["SPY", "QQQ", "XIU.TO", "BTC-USD", "CAD=X", "GC=F"])]}
+        self.whats_news = {"business": [f"- Business bullet {i}: {para[:140]}" for i in range(5)],
+                           "world": [f"- World bullet {i}: {para[:140]}" for i in range(5)]}
+        self.hero = {"title": "Bank of Canada Holds Rates as Inflation Cools", "subtitle": para[:200],
+                     "author": "The Editorial Board"}
+        self.featured = {"items": [{"title": f"Featured story {i}", "category": "Markets", "summary": para[:220]}
+                                   for i in range(4)]}
+        self.deep_dive = {"cards": [{"title": f"Card {i}", "analysis": para} for i in range(3)],
+                          "stat": {"value": "4.25%", "label": "Policy rate"}}
+        self.global_briefing = {"items": [{"headline": f"Headline {i}", "context": para[:180]} for i in range(3)]}
+        self.opinions = {"items": [{"title": f"Opinion {i}", "author": "A. Writer", "role": "Columnist",
+                                    "snippet": para[:160]} for i in range(5)]}
+        self.campus = {"items": [{"title": f"Campus item {i}", "category": "Campus", "link": "https://yorku.ca",
+                                  "summary": para} for i in range(3)]}
+
+    def items(self, section):
+        return (getattr(self, section) or {}).get("items") or []
+
+
+def make_subscribers(n):
+    rng = random.Random(42)
+    profiles = [None, ("whats_news", "hero", "featured"), ("ticker", "deep_dive", "global_briefing"),
+                ("campus", "opinions")]
+    return [Subscriber(f"reader{i}@example.com",
+                       f"Reader {i}" if rng.random() < 0.6 else None,
+                       profiles[rng.randrange(len(profiles))])
+            for i in range(n)]
+
+
+def bench_compiled(edition, subscribers):
+    start = time.perf_counter()
+    compiled = compile_email(edition)
+    compile_time = time.perf_counter() - start
+    total_bytes = 0
+    start = time.perf_counter()
+    for sub in subscribers:
+        total_bytes += len(compiled.render(sub.name, sub.sections))
+    return compile_time, time.perf_counter() - start, total_bytes
+
+
+def bench_full(edition, subscribers):
+    start = time.perf_counter()
+    for sub in subscribers:
+        compile_email(edition).render(sub.name, sub.sections)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--recipients", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--baseline-sample", type=int, default=2000,
+                        help="recipients rendered with the full template (extrapolated per email)")
+    args = parser.parse_args()
+
+    edition = FixtureEdition()
+    print(f"sections: {', '.join(BODY_SECTIONS)} (+ ticker)")
+    print(f"size:     {format_size_report(compile_email(edition).size_report)}\n")
+    print(f"{'recipients':>10}  {'compile':>9}  {'render/email':>12}  {'full/email':>10}  {'total':>8}  {'avg size':>8}  {'speedup':>7}")
+
+    for n in args.recipients:
+        subscribers = make_subscribers(n)
+        compile_time, render_time, total_bytes = bench_compiled(edition, subscribers)
+        sample = subscribers[:min(n, args.baseline_sample)]
+        full_per_email = bench_full(edition, sample) / len(sample)
+        per_email = render_time / n
+        print(f"{n:>10}  {compile_time * 1e3:>7.2f}ms  {per_email * 1e6:>10.2f}µs  {full_per_email * 1e6:>8.1f}µs  "
+              f"{render_time:>7.2f}s  {total_bytes / n / 1024:>6.1f}KB  {full_per_email / per_email:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
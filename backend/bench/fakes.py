@@ -0,0 +1,235 @@
+"""
+Offline stand-ins used by the benchmarks: fixture RSS/image server, fake Gemini model,
+fake yfinance and a fake Resend batch endpoint (storage uses KSJ_STORAGE=memory).
+Every fake counts its calls in a shared Counters object so a benchmark can report
+them per stage.
+"""
+import json
+import re
+import threading
+import zlib
+import time
+from collections import Counter
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from xml.sax.saxutils import escape
+
+import numpy as np
+import pandas as pd
+
+
+class Counters:
+    """Thread-safe call counters shared by all fakes."""
+
+    def __init__(self):
+        self._counts = Counter()
+        self._lock = threading.Lock()
+
+    def add(self, name, n=1):
+        with self._lock:
+            self._counts[name] += n
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._counts)
+
+
+# --- Fixture RSS feeds and images ---
+
+SUBJECTS = ["Bank of Canada", "Oil prices", "The loonie", "Tech stocks", "Housing starts", "Bond yields",
+            "Retail sales", "Gold", "Wheat futures", "Bay Street", "Ottawa", "Federal Reserve"]
+VERBS = ["climb", "slide", "stall", "rebound", "surge", "weaken", "hold steady", "rally"]
+REASONS = ["after inflation data", "on tariff worries", "as exports cool", "ahead of earnings",
+           "amid rate-cut bets", "as jobs data surprises", "on supply concerns", "after budget update"]
+
+
+def headline(feed, entry):
+    return (f"{SUBJECTS[(feed * 7 + entry) % len(SUBJECTS)]} {VERBS[(feed + entry * 3) % len(VERBS)]} "
+            f"{REASONS[(feed * 5 + entry * 2) % len(REASONS)]} ({feed}-{entry})")
+
+
+def rss_document(base_url, feed, entries):
+    items = []
+    for entry in range(entries):
+        title = headline(feed, entry)
+        items.append(
+            f"<item><title>{escape(title)}</title>"
+            f"<link>{base_url}/article/{feed}/{entry}</link>"
+            f"<author>reporter@example.com (Staff Reporter)</author>"
+            f"<description>{escape(title)}. Analysts said the move reflects shifting expectations "
+            f"for growth, rates and trade over the coming quarter.</description>"
+            f'<media:content url="{base_url}/img/{feed}-{entry}.jpg" medium="image" width="1200"/>'
+            f"</item>"
+        )
+    return (f'<?xml version="1.0"?><rss version="2.0" xmlns:media="http://search.yahoo.com/mrss/">'
+            f"<channel><title>Fixture feed {feed}</title>{''.join(items)}</channel></rss>").encode()
+
+
+class FixtureServer:
+    """Local HTTP server for /feed/<n>.xml (with ETag revalidation) and /img/* (tiny JPEG)."""
+
+    def __init__(self, counters, entries=20, latency=0.0):
+        self.counters = counters
+        self.entries = entries
+        self.latency = latency
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _respond(self, body_wanted):
+                if self.path.startswith("/feed/"):
+                    server.counters.add("feed_requests")
+                    time.sleep(server.latency)
+                    feed = int(re.sub(r"\D", "", self.path) or 0)
+                    etag = f'"{feed}-{server.entries}"'
+                    if self.headers.get("If-None-Match") == etag:
+                        self.send_response(304)
+                        self.send_header("ETag", etag)
+                        self.send_header("Content-Length", "0")
+                        self.end_headers()
+                        return
+                    body = rss_document(server.base_url, feed, server.entries)
+                    content_type = "application/rss+xml"
+                    self.send_response(200)
+                    self.send_header("ETag", etag)
+                elif self.path.startswith("/img/"):
+                    server.counters.add("image_requests")
+                    body, content_type = b"\xff\xd8\xff\xd9", "image/jpeg"
+                    self.send_response(206 if self.headers.get("Range") else 200)
+                else:
+                    body, content_type = b"not found", "text/plain"
+                    self.send_response(404)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                if body_wanted:
+                    self.wfile.write(body)
+
+            def do_GET(self):
+                self._respond(True)
+
+            def do_HEAD(self):
+                self._respond(False)
+
+            def log_message(self, *args):
+                pass
+
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._httpd.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self._httpd.server_port}"
+        threading.Thread(target=self._httpd.serve_forever, daemon=True).start()
+
+    def feed_url(self, n):
+        return f"{self.base_url}/feed/{n}.xml"
+
+    def close(self):
+        self._httpd.shutdown()
+
+
+# --- Fake Gemini ---
+
+PARAGRAPH = ("Economists said the shift reflects a mix of slower consumer spending, firmer commodity prices "
+             "and a central bank that remains wary of cutting too early. For students, the practical effect "
+             "shows up in borrowing costs, summer job markets and the price of everyday goods.")
+
+
+def _candidates(prompt):
+    """(candidate number or None, title) for each '3. [source] title — summary' or '- [source] ...' line."""
+    return [(int(number) if number else None, title) for number, title in
+            re.findall(r"^\s*(?:(\d+)\.|-) \[[^\]]*\] (.*?)(?: \(covered by \d+ outlets\))? — ", prompt, re.M)]
+
+
+def fake_response(prompt):
+    """A plausible response for each task's prompt, keyed on the editor role it asks for."""
+    article = {"content": [PARAGRAPH] * 3, "keyPoints": ["Rates matter for tuition loans", "Trade flows are shifting"]}
+    if "Editor-in-Chief" in prompt:
+        return json.dumps({"title": "Bank of Canada Signals a Long Pause", "subtitle": PARAGRAPH[:140], **article})
+    if "Managing Editor" in prompt:
+        picks = _candidates(prompt)[:4] or [(None, "Fixture story")] * 4
+        return json.dumps([{"id": f"featured-{i}", "candidate": n, "category": "Markets", "title": t,
+                            "summary": PARAGRAPH[:120],
+                            "date": date.today().strftime("%b %d, %Y"), "author": "Staff", **article}
+                           for i, (n, t) in enumerate(picks)])
+    if "Opinion Editor" in prompt:
+        return json.dumps([{"title": f"Opinion {i}: Rates Are Still Too High", "author": f"Dr. Writer {i}",
+                            "role": "Prof. of Macroeconomics", "snippet": PARAGRAPH[:160], **article}
+                           for i in range(5)])
+    if "Chief Economist" in prompt:
+        return json.dumps({"cards": [{"title": f"Card {i}", "analysis": PARAGRAPH[:160], **article} for i in range(3)],
+                           "stat": {"value": "4.2%", "label": "Current 10Y Yield", "source": "Yahoo Finance Data"}})
+    if "Foreign Editor" in prompt:
+        return json.dumps([{"headline": f"Global headline {i}", "context": PARAGRAPH[:160]} for i in range(3)])
+    if "Campus Editor" in prompt:
+        match = re.search(r"Raw Articles: (\[.*?\])\n", prompt, re.S)
+        stories = json.loads(match.group(1))[:3] if match else []
+        return json.dumps(stories)
+    return "\n".join(f"- Fixture bullet {i}: {PARAGRAPH[:90]}" for i in range(5))
+
+
+class FakeGeminiModel:
+    """Drop-in for genai.GenerativeModel: fixed latency, canned responses, optional streaming."""
+
+    def __init__(self, counters, latency=0.5, chunks=8):
+        self.counters = counters
+        self.latency = latency
+        self.chunks = chunks
+
+    def generate_content(self, prompt, generation_config=None, stream=False, request_options=None):
+        self.counters.add("gemini_calls")
+        self.counters.add("gemini_prompt_chars", len(prompt))
+        text = fake_response(prompt)
+        if not stream:
+            time.sleep(self.latency)
+            return SimpleNamespace(text=text)
+        return self._stream(text)
+
+    def _stream(self, text):
+        # Time to first token, then the rest of the response spread evenly
+        time.sleep(self.latency * 0.3)
+        size = max(1, len(text) // self.chunks + 1)
+        for i in range(0, len(text), size):
+            time.sleep(self.latency * 0.7 / self.chunks)
+            yield SimpleNamespace(text=text[i:i + size])
+
+
+# --- Fake yfinance ---
+
+class FakeYFinance:
+    """yf.download() returning a deterministic random walk per symbol, columns (field, symbol)."""
+
+    def __init__(self, counters, latency=0.2):
+        self.counters = counters
+        self.latency = latency
+
+    def download(self, symbols, start=None, interval="1d", progress=False, threads=True, **kwargs):
+        self.counters.add("yf_downloads")
+        time.sleep(self.latency)
+        symbols = [symbols] if isinstance(symbols, str) else list(symbols)
+        days = pd.bdate_range(start or date.today() - timedelta(days=30), date.today())
+        frames = {}
+        for symbol in symbols:
+            rng = np.random.default_rng(zlib.crc32(symbol.encode()))
+            close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, len(days))))
+            frames[symbol] = pd.DataFrame({"Open": close, "High": close * 1.01, "Low": close * 0.99,
+                                           "Close": close, "Volume": rng.integers(1e5, 1e6, len(days))},
+                                          index=days)
+        return pd.concat(frames, axis=1).swaplevel(0, 1, axis=1) if frames else pd.DataFrame()
+
+
+# --- Fake Resend ---
+
+class FakeResendBatch:
+    """Replacement for resend.Batch.send: sleeps per call and accepts every message."""
+
+    def __init__(self, counters, latency=0.1):
+        self.counters = counters
+        self.latency = latency
+
+    def send(self, messages, options=None):
+        self.counters.add("resend_batches")
+        self.counters.add("emails_sent", len(messages))
+        self.counters.add("email_bytes", sum(len(m.get("html", "")) for m in messages))
+        time.sleep(self.latency)
+        return {"data": [{"id": f"fake-{i}"} for i in range(len(messages))], "errors": []}
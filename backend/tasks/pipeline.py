@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+"""
+KSJournal Pipeline Orchestrator
+Runs task scripts in-process as a dependency graph instead of one subprocess each.
+Independent sections run concurrently on the same warm Firebase / Gemini clients,
+each with its own timeout, and the run ends with the usual PASS/FAIL report.
+Section outputs are staged and published as one atomic edition write.
+Usage: imported by run_daily.py, run_content.py and run_ticker_and_send.py
+"""
+import contextvars
+import importlib
+import io
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime
+
+TASKS_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(TASKS_DIR)
+
+# Task modules are imported by name and import 'app.*' relative to the backend folder
+for path in (TASKS_DIR, BACKEND_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from app import spans
+
+DEFAULT_TIMEOUT = 120
+MAX_WORKERS = int(os.getenv("KSJ_PIPELINE_WORKERS", "4"))
+
+# key: (display name, module, entry function, dependencies, timeout seconds)
+TASKS = {
+    "ticker":           ("Market Ticker",    "update_ticker",           "update_market_data",       [], DEFAULT_TIMEOUT),
+    "whats_news":       ("What's News",      "update_whats_news",       "update_news",              [], DEFAULT_TIMEOUT),
+    "hero_story":       ("Hero Story",       "update_hero_story",       "update_hero_and_featured", [], DEFAULT_TIMEOUT),
+    "featured_stories": ("Featured Stories", "update_featured_stories", "update_featured_stories",  [], DEFAULT_TIMEOUT),
+    "opinions":         ("Opinions",         "update_opinions",         "update_opinions",          [], DEFAULT_TIMEOUT),
+    "deep_dive":        ("Deep Dive",        "update_deep_dive",        "update_deep_dive",         [], DEFAULT_TIMEOUT),
+    "global_briefing":  ("Global Briefing",  "update_global_briefing",  "update_global",            [], DEFAULT_TIMEOUT),
+    "campus_news":      ("Campus News",      "update_campus_news",      "fetch_and_curate",         [], DEFAULT_TIMEOUT),
+    "newsletter":       ("Newsletter Email", "send_newsletter",         "send_newsletter",
+                         ["ticker", "hero_story", "whats_news"], DEFAULT_TIMEOUT),
+}
+
+# Edition section each task publishes, so the output of a task that timed out can be dropped
+SECTION_OF = {
+    "ticker": "ticker",
+    "whats_news": "whats_news",
+    "hero_story": "hero",
+    "featured_stories": "featured",
+    "opinions": "opinions",
+    "deep_dive": "deep_dive",
+    "global_briefing": "global_briefing",
+    "campus_news": "campus",
+}
+
+# Tasks that read the published edition: the staged edition is committed before they
+# start, once every other task in the run has finished (successfully or not)
+READS_EDITION = {"newsletter"}
+
+
+class _ThreadOutput(io.TextIOBase):
+    """stdout/stderr proxy that buffers writes per task.
+
+    Concurrent tasks would otherwise interleave their progress lines. Each task's
+    output is printed as one block when it finishes, like the old subprocess runner.
+    The buffer lives in a context variable, so pool threads running work wrapped
+    with spans.bind() write into their task's block too.
+    """
+
+    def __init__(self, stream):
+        self._stream = stream
+        self._buffer = contextvars.ContextVar(f"ksj_output_{id(self)}", default=None)
+
+    def start_capture(self):
+        self._buffer.set(io.StringIO())
+
+    def stop_capture(self):
+        buf = self._buffer.get()
+        self._buffer.set(None)
+        return buf.getvalue() if buf else ""
+
+    def write(self, text):
+        buf = self._buffer.get()
+        if buf is not None:
+            return buf.write(text)
+        return self._stream.write(text)
+
+    def flush(self):
+        self._stream.flush()
+
+
+def _run_task(key, out, err, done):
+    """Thread body: import the task module, call its entry point, report back."""
+    _, module_name, func_name, _, _ = TASKS[key]
+    out.start_capture()
+    err.start_capture()
+    start = time.time()
+    success = True
+    try:
+        with spans.span(f"task.{key}", task=key):
+            module = importlib.import_module(module_name)
+            getattr(module, func_name)()
+    except SystemExit as e:
+        success = e.code in (None, 0)
+    except Exception as e:
+        print(f"❌ Unhandled error: {e}")
+        success = False
+    elapsed = time.time() - start
+    done.put((key, success, elapsed, out.stop_capture() + err.stop_capture()))
+
+
+def _publish_edition():
+    """Commit the staged sections in one batch. Returns True on success."""
+    from app.db import commit_edition
+    try:
+        with spans.span("task.edition", task="edition"):
+            commit_edition()
+        return True
+    except Exception as e:
+        print(f"❌ Edition publish failed: {e}")
+        return False
+
+
+def _ai_cache_stats():
+    """The AI response cache counters so far, zeros if app.genai_engine isn't loaded yet."""
+    genai_engine = sys.modules.get("app.genai_engine")
+    return genai_engine.cache_stats() if genai_engine else {"hits": 0, "misses": 0}
+
+
+def run_pipeline(keys, title, report_title):
+    """Run the given task keys respecting dependencies. Exits 1 if any task failed."""
+    print(f"{'='*60}")
+    print(f"  THE KEELE STREET JOURNAL - {title}")
+    print(f"  {datetime.now().strftime('%A, %B %d, %Y at %I:%M %p')}")
+    print(f"{'='*60}\n")
+    spans_start, cache_start = spans.mark(), _ai_cache_stats()
+
+    # Dependencies outside this run (e.g. content produced by an earlier job) are ignored
+    deps = {k: [d for d in TASKS[k][3] if d in keys] for k in keys}
+    writers = [k for k in keys if k not in READS_EDITION]
+    staging = bool(writers)
+    if staging:
+        from app.db import begin_edition, reject_section
+        begin_edition()
+    published = None  # None until the staged edition has been committed
+
+    out, err = _ThreadOutput(sys.stdout), _ThreadOutput(sys.stderr)
+    real_stdout, real_stderr = sys.stdout, sys.stderr
+    sys.stdout, sys.stderr = out, err
+
+    done = queue.Queue()
+    pending = list(keys)
+    running = {}  # key -> deadline
+    results = {}  # key -> (success, elapsed)
+
+    try:
+        while pending or running:
+            # 1. Skip tasks whose dependencies failed
+            for key in list(pending):
+                failed_deps = [d for d in deps[key] if d in results and not results[d][0]]
+                if failed_deps:
+                    pending.remove(key)
+                    results[key] = (False, 0)
+                    names = ", ".join(TASKS[d][0] for d in failed_deps)
+                    real_stdout.write(f"\n--- Skipping: {TASKS[key][0]} — dependency failed ({names}) ---\n")
+
+            # 2. Launch everything that is ready, up to the worker limit
+            for key in list(pending):
+                if len(running) >= MAX_WORKERS:
+                    break
+                if all(d in results for d in deps[key]):
+                    if key in READS_EDITION and staging and published is None:
+                        if not all(w in results for w in writers):
+                            continue
+                        published = _publish_edition()
+                    pending.remove(key)
+                    name, module_name = TASKS[key][0], TASKS[key][1]
+                    real_stdout.write(f"\n--- Running: {name} ({module_name}.py) ---\n")
+                    running[key] = time.time() + TASKS[key][4]
+                    threading.Thread(target=_run_task, args=(key, out, err, done), daemon=True).start()
+
+            if not running:
+                continue
+
+            # 3. Wait for the next task to finish or the nearest deadline to pass
+            wait = max(0.0, min(running.values()) - time.time())
+            try:
+                key, success, elapsed, output = done.get(timeout=wait)
+            except queue.Empty:
+                now = time.time()
+                for key, deadline in list(running.items()):
+                    if now >= deadline:
+                        timeout = TASKS[key][4]
+                        del running[key]
+                        results[key] = (False, timeout)
+                        # Its thread keeps running and may still publish: keep that out of the edition
+                        if staging and key in SECTION_OF:
+                            reject_section(SECTION_OF[key])
+                        real_stdout.write(f"--- {TASKS[key][0]}: TIMEOUT ({timeout}s) ---\n")
+                continue
+
+            if key not in running:
+                continue  # Finished after its timeout was already reported
+            del running[key]
+            results[key] = (success, elapsed)
+            if output.strip():
+                real_stdout.write(output.strip() + "\n")
+            status = "OK" if success else "FAIL"
+            real_stdout.write(f"--- {TASKS[key][0]}: {status} ({elapsed:.1f}s) ---\n")
+    finally:
+        sys.stdout, sys.stderr = real_stdout, real_stderr
+
+    if staging and published is None:
+        published = _publish_edition()
+
+    # Summary
+    print(f"\n{'='*60}")
+    print(f"  {report_title}")
+    print(f"{'='*60}")
+    for key in keys:
+        success, elapsed = results[key]
+        icon = "PASS" if success else "FAIL"
+        print(f"  [{icon}] {TASKS[key][0]} ({elapsed:.1f}s)")
+
+    if staging:
+        icon = "PASS" if published else "FAIL"
+        print(f"  [{icon}] Edition Publish")
+
+    # Busy time per phase: concurrent calls inside a task can add up to more than its wall time
+    phases = spans.breakdown(since=spans_start)
+    if phases:
+        print("\n  Phase breakdown (busy seconds, call count):")
+        names = {**{k: TASKS[k][0] for k in keys}, "edition": "Edition Publish"}
+        for key in [k for k in keys if k in phases] + ["edition"] * ("edition" in phases):
+            print(f"    {names[key]:<18} {spans.format_phases(phases[key])}")
+
+    # The counters are process-wide, so report only this run's share
+    stats = {k: v - cache_start.get(k, 0) for k, v in _ai_cache_stats().items()}
+    if stats["hits"] or stats["misses"]:
+        print(f"\n  AI cache: {stats['hits']} hit(s), {stats['misses']} miss(es)")
+
+    failed = sum(1 for k in keys if not results[k][0]) + (staging and not published)
+    total = len(keys) + staging
+    if failed:
+        print(f"\n  WARNING: {failed}/{total} task(s) failed.")
+        sys.exit(1)
+    else:
+        print(f"\n  All {total} tasks completed successfully.")
@@ -1,271 +1,107 @@
 #!/usr/bin/env python3
 """
 KSJ Daily Newsletter — sends the morning edition to all subscribers.
-Reads today's content from Firestore, builds an HTML email, sends via Resend.
+Reads today's content from Firestore, compiles the HTML email once, renders a
+personalized copy per subscriber and sends via Resend.
 """
 import os
+import socket
 import sys
-from datetime import datetime, timezone
+import threading
+import time
+from datetime import date, datetime, timezone
+from itertools import takewhile
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import resend
-from app.db import db
-
-SITE_URL = "https://theksj.com"
-
-
-def slugify(text: str) -> str:
-    import re
-    return re.sub(r"[^a-z0-9]+", "-", text.lower()).strip("-")[:60]
-
-
-def get_subscribers() -> list[str]:
-    """Fetch all subscriber emails from Firestore."""
-    docs = db.collection("subscribers").stream()
-    emails = [doc.to_dict().get("email") for doc in docs]
-    return [e for e in emails if e]
-
-
-def get_daily_content() -> dict:
-    """Fetch all daily edition content from Firestore."""
-    collections = {
-        "ticker": ("system", "market_ticker"),
-        "whats_news": ("daily_edition", "whats_news"),
-        "hero": ("daily_edition", "hero_story"),
-        "featured": ("daily_edition", "featured_stories"),
-        "opinions": ("daily_edition", "opinions"),
-        "deep_dive": ("daily_edition", "deep_dive"),
-        "global_briefing": ("daily_edition", "global_briefing"),
-        "campus": ("daily_edition", "campus_news"),
-    }
-    data = {}
-    for key, (collection, doc_id) in collections.items():
-        snap = db.collection(collection).document(doc_id).get()
-        data[key] = snap.to_dict() if snap.exists else None
-    return data
-
-
-def build_email_html(content: dict) -> str:
-    """Build a newspaper-style HTML email from daily content."""
-    today = datetime.now().strftime("%A, %B %d, %Y")
-
-    # --- Market Ticker ---
-    ticker_html = ""
-    if content.get("ticker") and content["ticker"].get("items"):
-        ticker_items = []
-        for item in content["ticker"]["items"]:
-            bg = "#dcfce7" if item.get("isUp") else "#fee2e2"
-            text_color = "#166534" if item.get("isUp") else "#991b1b"
-            arrow = "▲" if item.get("isUp") else "▼"
-            ticker_items.append(
-                f'<td style="padding:8px 4px;text-align:center;font-size:11px;font-family:Arial,sans-serif;">'
-                f'<div style="background:#ffffff;border:1px solid #e4e4e7;border-radius:4px;padding:8px 6px;">'
-                f'<span style="color:#18181b;font-weight:bold;font-size:10px;text-transform:uppercase;letter-spacing:0.5px;">{item["symbol"]}</span><br>'
-                f'<span style="color:#18181b;font-size:14px;font-weight:bold;">{item["price"]}</span><br>'
-                f'<span style="background:{bg};color:{text_color};font-size:10px;font-weight:bold;padding:2px 6px;border-radius:3px;display:inline-block;margin-top:2px;">{arrow} {item.get("change","")}</span>'
-                f'</div></td>'
-            )
-        ticker_html = f"""
-        <table width="100%" cellpadding="0" cellspacing="0" style="background:#f4f4f5;padding:8px 4px;border-bottom:1px solid #e4e4e7;">
-          <tr>{"".join(ticker_items)}</tr>
-        </table>"""
-
-    # --- What's News ---
-    whats_news_html = ""
-    if content.get("whats_news"):
-        wn = content["whats_news"]
-        biz_bullets = "".join(
-            f'<li style="margin-bottom:6px;font-size:13px;color:#3f3f46;line-height:1.5;">{b.lstrip("- •")}</li>'
-            for b in (wn.get("business") or [])
-        )
-        world_bullets = "".join(
-            f'<li style="margin-bottom:6px;font-size:13px;color:#3f3f46;line-height:1.5;">{b.lstrip("- •")}</li>'
-            for b in (wn.get("world") or [])
-        )
-        whats_news_html = f"""
-        <div style="margin-bottom:32px;">
-          <h2 style="font-family:Georgia,serif;font-size:16px;text-transform:uppercase;letter-spacing:2px;border-bottom:2px solid #18181b;padding-bottom:6px;margin-bottom:12px;">What's News</h2>
-          <h3 style="font-size:11px;text-transform:uppercase;letter-spacing:1px;color:#991b1b;margin-bottom:8px;">Business & Finance</h3>
-          <ul style="padding-left:16px;margin:0 0 16px 0;">{biz_bullets}</ul>
-          <h3 style="font-size:11px;text-transform:uppercase;letter-spacing:1px;color:#991b1b;margin-bottom:8px;">World</h3>
-          <ul style="padding-left:16px;margin:0;">{world_bullets}</ul>
-        </div>"""
-
-    # --- Hero Story ---
-    hero_html = ""
-    if content.get("hero"):
-        h = content["hero"]
-        hero_slug = f"hero-{slugify(h.get('title', ''))}"
-        hero_html = f"""
-        <div style="margin-bottom:32px;border-bottom:1px solid #e4e4e7;padding-bottom:24px;">
-          <span style="font-size:10px;text-transform:uppercase;letter-spacing:2px;color:#991b1b;font-weight:bold;">Special Report</span>
-          <h1 style="font-family:Georgia,serif;font-size:26px;margin:8px 0;line-height:1.2;">
-            <a href="{SITE_URL}/article/{hero_slug}" style="color:#18181b;text-decoration:none;">{h.get("title","")}</a>
-          </h1>
-          <p style="font-family:Georgia,serif;font-size:15px;color:#52525b;line-height:1.6;margin:0 0 8px 0;">{h.get("subtitle","")}</p>
-          <span style="font-size:10px;color:#a1a1aa;text-transform:uppercase;">By {h.get("author","Staff")}</span>
-        </div>"""
-
-    # --- Featured Stories ---
-    featured_html = ""
-    if content.get("featured") and content["featured"].get("items"):
-        cards = []
-        for i, story in enumerate(content["featured"]["items"][:4]):
-            slug = f"featured-{i}-{slugify(story.get('title', ''))}"
-            cards.append(f"""
-            <div style="padding:16px 0;border-bottom:1px solid #f4f4f5;">
-              <span style="font-size:10px;text-transform:uppercase;letter-spacing:1px;color:#991b1b;font-weight:bold;">{story.get("category","")}</span>
-              <h3 style="font-family:Georgia,serif;font-size:16px;margin:4px 0;">
-                <a href="{SITE_URL}/article/{slug}" style="color:#18181b;text-decoration:none;">{story.get("title","")}</a>
-              </h3>
-              <p style="font-size:13px;color:#71717a;margin:4px 0 0 0;line-height:1.5;">{story.get("summary","")}</p>
-            </div>""")
-        featured_html = f"""
-        <div style="margin-bottom:32px;">
-          <h2 style="font-family:Georgia,serif;font-size:14px;text-transform:uppercase;letter-spacing:2px;border-bottom:1px solid #e4e4e7;padding-bottom:6px;margin-bottom:4px;">Featured Stories</h2>
-          {"".join(cards)}
-        </div>"""
-
-    # --- Deep Dive ---
-    deep_dive_html = ""
-    if content.get("deep_dive"):
-        dd = content["deep_dive"]
-        dd_cards = []
-        for i, card in enumerate(dd.get("cards") or []):
-            dd_cards.append(f"""
-            <div style="padding:12px 0;border-bottom:1px solid #3f3f46;">
-              <h3 style="font-family:Georgia,serif;font-size:14px;color:#ffffff;margin:0 0 4px 0;">{card.get("title","")}</h3>
-              <p style="font-size:12px;color:#a1a1aa;line-height:1.5;margin:0;">{card.get("analysis","")}</p>
-            </div>""")
-        stat = dd.get("stat") or {}
-        deep_dive_html = f"""
-        <div style="background:#18181b;padding:24px;margin:0 -24px 32px -24px;">
-          <h2 style="font-size:13px;text-transform:uppercase;letter-spacing:2px;color:#ffffff;border-bottom:1px solid #3f3f46;padding-bottom:8px;margin-bottom:12px;">📊 Market Deep Dive</h2>
-          {"".join(dd_cards)}
-          <div style="text-align:center;padding:16px 0 0 0;">
-            <span style="font-size:28px;font-weight:bold;color:#ffffff;">{stat.get("value","")}</span><br>
-            <span style="font-size:10px;text-transform:uppercase;letter-spacing:1px;color:#a1a1aa;">{stat.get("label","")}</span>
-          </div>
-        </div>"""
-
-    # --- Global Briefing ---
-    global_html = ""
-    if content.get("global_briefing") and content["global_briefing"].get("items"):
-        items = []
-        for i, item in enumerate(content["global_briefing"]["items"][:3]):
-            items.append(f"""
-            <div style="padding:12px 0;border-bottom:1px solid #f4f4f5;">
-              <span style="font-family:Georgia,serif;font-size:20px;color:#e4e4e7;font-weight:bold;margin-right:8px;">0{i+1}</span>
-              <strong style="font-family:Georgia,serif;font-size:15px;color:#18181b;">{item.get("headline","")}</strong>
-              <p style="font-size:13px;color:#71717a;margin:4px 0 0 0;line-height:1.5;">{item.get("context","")}</p>
-            </div>""")
-        global_html = f"""
-        <div style="margin-bottom:32px;">
-          <h2 style="font-family:Georgia,serif;font-size:14px;text-transform:uppercase;letter-spacing:2px;border-bottom:1px solid #e4e4e7;padding-bottom:6px;margin-bottom:8px;">Global Briefing</h2>
-          {"".join(items)}
-        </div>"""
-
-    # --- Opinions ---
-    opinions_html = ""
-    if content.get("opinions") and content["opinions"].get("items"):
-        op_items = []
-        for op in content["opinions"]["items"][:3]:
-            op_items.append(f"""
-            <div style="padding:10px 0;border-bottom:1px solid #f4f4f5;">
-              <h4 style="font-family:Georgia,serif;font-size:14px;color:#18181b;margin:0 0 2px 0;">{op.get("title","")}</h4>
-              <span style="font-size:10px;color:#991b1b;text-transform:uppercase;">{op.get("author","")} — {op.get("role","")}</span>
-              <p style="font-size:12px;color:#71717a;margin:4px 0 0 0;line-height:1.4;">{op.get("snippet","")}</p>
-            </div>""")
-        opinions_html = f"""
-        <div style="margin-bottom:32px;">
-          <h2 style="font-family:Georgia,serif;font-size:14px;text-transform:uppercase;letter-spacing:2px;border-bottom:1px solid #e4e4e7;padding-bottom:6px;margin-bottom:8px;">Opinion</h2>
-          {"".join(op_items)}
-        </div>"""
-
-    # --- Campus News ---
-    campus_html = ""
-    if content.get("campus") and content["campus"].get("items"):
-        c_items = []
-        for item in content["campus"]["items"][:3]:
-            c_items.append(f"""
-            <div style="padding:10px 0;border-bottom:1px solid #f4f4f5;">
-              <span style="font-size:9px;text-transform:uppercase;letter-spacing:1px;color:#991b1b;font-weight:bold;">{item.get("category","Campus")}</span>
-              <h4 style="font-family:Georgia,serif;font-size:14px;color:#18181b;margin:2px 0;">
-                <a href="{item.get('link','#')}" style="color:#18181b;text-decoration:none;">{item.get("title","")}</a>
-              </h4>
-              <p style="font-size:12px;color:#71717a;margin:2px 0 0 0;line-height:1.4;">{item.get("summary","")[:120]}...</p>
-            </div>""")
-        campus_html = f"""
-        <div style="margin-bottom:32px;">
-          <h2 style="font-family:Georgia,serif;font-size:14px;text-transform:uppercase;letter-spacing:2px;border-bottom:1px solid #e4e4e7;padding-bottom:6px;margin-bottom:8px;">Campus & Career</h2>
-          {"".join(c_items)}
-        </div>"""
-
-    # --- Full Email ---
-    return f"""<!DOCTYPE html>
-<html lang="en">
-<head><meta charset="UTF-8"><meta name="viewport" content="width=device-width,initial-scale=1.0"></head>
-<body style="margin:0;padding:0;background:#f4f4f5;font-family:-apple-system,BlinkMacSystemFont,'Segoe UI',Roboto,sans-serif;">
-  <div style="max-width:600px;margin:0 auto;background:#ffffff;">
-
-    <!-- HEADER -->
-    <div style="text-align:center;padding:24px 24px 16px 24px;border-bottom:3px double #18181b;">
-      <h1 style="font-family:Georgia,serif;font-size:28px;margin:0;letter-spacing:-0.5px;">The Keele Street Journal</h1>
-      <p style="font-size:11px;color:#71717a;margin:4px 0 0 0;font-style:italic;">{today} — Morning Edition</p>
-    </div>
-
-    {ticker_html}
-
-    <!-- BODY -->
-    <div style="padding:24px;">
-      {whats_news_html}
-      {hero_html}
-      {featured_html}
-      {deep_dive_html}
-      {global_html}
-      {opinions_html}
-      {campus_html}
-
-      <!-- CTA -->
-      <div style="text-align:center;padding:24px 0;border-top:2px solid #18181b;">
-        <a href="{SITE_URL}" style="display:inline-block;background:#18181b;color:#ffffff;padding:12px 32px;font-size:13px;font-weight:bold;text-decoration:none;text-transform:uppercase;letter-spacing:1px;">Read Full Edition →</a>
-      </div>
-    </div>
-
-    <!-- FOOTER -->
-    <div style="background:#18181b;padding:24px;text-align:center;">
-      <p style="font-family:Georgia,serif;font-size:14px;color:#ffffff;margin:0 0 8px 0;">The Keele Street Journal</p>
-      <p style="font-size:11px;color:#71717a;margin:0 0 12px 0;">AI-powered financial news for Economics students</p>
-      <p style="font-size:10px;color:#52525b;margin:0;">
-        You're receiving this because you subscribed at theksj.com<br>
-        &copy; {datetime.now().year} The Keele Street Journal
-      </p>
-    </div>
-
-  </div>
-</body>
-</html>"""
-
-
-def check_content_freshness() -> bool:
+from app.db import EDITION_DOCS, Edition, get_storage, load_edition
+from app.ledger import open_ledger, recipient_key
+from app import mailer
+from app.mailer import deliver
+from app.newsletter import SECTIONS, Subscriber, compile_email, format_size_report
+from app.shards import DONE, LEASE_SECONDS, PENDING, SHARD_KEY_FIELD, all_done, email_range, open_leases
+
+SUBSCRIBER_PAGE_SIZE = 500
+NEWSLETTER_SHARDS = int(os.getenv("KSJ_NEWSLETTER_SHARDS", "1"))
+NEWSLETTER_WORKERS = int(os.getenv("KSJ_NEWSLETTER_WORKERS", "0"))  # 0: one process per shard
+SHARD_WAIT = int(os.getenv("KSJ_SHARD_WAIT", "600"))  # seconds a runner waits on shards leased elsewhere
+
+
+def normalize_email(email) -> str | None:
+    """Trim and lowercase an address; None if it can't be an email."""
+    if not isinstance(email, str):
+        return None
+    email = email.strip().lower()
+    return email if "@" in email.strip("@") else None
+
+
+def _to_subscriber(email: str, data: dict) -> Subscriber:
+    """Optional profile fields are hand-edited in the console, so anything malformed is ignored."""
+    name = data.get("name")
+    name = name.strip() or None if isinstance(name, str) else None
+    sections = data.get("sections")
+    sections = tuple(k for k in sections if k in SECTIONS) or None if isinstance(sections, list) else None
+    return Subscriber(email, name, sections)
+
+
+def iter_subscribers(page_size: int = SUBSCRIBER_PAGE_SIZE, skip: set = None, email_range: tuple = None):
+    """Yield unique Subscribers (normalized email, name, section preferences) page by page.
+
+    Only the fields the email needs are read, pages follow a cursor, and duplicates are
+    dropped using 8-byte digests rather than keeping every address in memory. Recipients
+    whose digest is in `skip` (already handled by an earlier run) are left out.
+    `email_range` (start, end) reads only the subscribers whose emailKey is in it.
+    """
+    seen = set(skip or ())
+    start, end = email_range or (None, None)
+    docs = get_storage().stream("subscribers", ["email", "name", "sections"], page_size,
+                                order_by=SHARD_KEY_FIELD if email_range else None, start=start, end=end)
+    for _, data in docs:
+        email = normalize_email(data.get("email"))
+        if not email:
+            continue
+        digest = recipient_key(email)
+        if digest in seen:
+            continue
+        seen.add(digest)
+        yield _to_subscriber(email, data)
+
+
+def backfill_email_keys(page_size: int = SUBSCRIBER_PAGE_SIZE) -> int:
+    """Write the normalized emailKey on subscribers missing it (or holding a stale one).
+
+    Shards range over emailKey, so a subscriber without it would be in no shard. Sign-ups
+    write it, this covers documents created before that. Returns how many were updated.
+    """
+    storage = get_storage()
+    writes, updated = [], 0
+    for doc_id, data in storage.stream("subscribers", ["email", SHARD_KEY_FIELD], page_size):
+        key = normalize_email(data.get("email"))
+        if key and data.get(SHARD_KEY_FIELD) != key:
+            writes.append((f"subscribers/{doc_id}", {SHARD_KEY_FIELD: key}, True))
+        if len(writes) >= page_size:
+            storage.write(writes)
+            updated, writes = updated + len(writes), []
+    if writes:
+        storage.write(writes)
+    return updated + len(writes)
+
+
+def check_content_freshness(edition: Edition) -> bool:
     """Verify that key content was updated today before sending the newsletter."""
     today = datetime.now(timezone.utc).date()
 
     # Check a few critical sections — if these are stale, don't send
-    critical_docs = [
-        ("daily_edition", "hero_story"),
-        ("daily_edition", "whats_news"),
-    ]
-
-    for collection, doc_id in critical_docs:
-        snap = db.collection(collection).document(doc_id).get()
-        if not snap.exists:
+    critical_sections = ["hero", "whats_news"]
+
+    for section in critical_sections:
+        collection, doc_id = EDITION_DOCS[section]
+        if getattr(edition, section) is None:
             print(f"❌ Content missing: {collection}/{doc_id}")
             return False
 
-        data = snap.to_dict()
-        last_updated = data.get("lastUpdated")
+        last_updated = edition.last_updated(section)
         if last_updated is None:
             print(f"⚠️ No lastUpdated on {collection}/{doc_id} — skipping freshness check")
             continue
@@ -278,7 +114,152 @@ def check_content_freshness() -> bool:
     return True
 
 
-def send_newsletter():
+def message_factory(compiled):
+    """make_message(subscriber) for mailer.deliver: one personalized message per recipient."""
+    today = datetime.now().strftime("%B %d, %Y")
+
+    # One recipient per message to keep subscriber emails private (no CC/BCC exposure)
+    def make_message(subscriber):
+        return {
+            "from": "The Keele Street Journal <newsletter@theksj.com>",
+            "to": [subscriber.email],
+            "subject": f"KSJ Morning Edition — {today}",
+            "html": compiled.render(subscriber.name, subscriber.sections),
+        }
+
+    return make_message
+
+
+def _send(edition_id, compiled, email_range=None, stop=None):
+    """Stream subscribers the ledger hasn't seen (in `email_range`, if given) into Resend's batch endpoint.
+
+    Sending starts as soon as the first page of subscribers arrives. Setting `stop` ends
+    the stream early; batches already in flight still finish and are recorded.
+    """
+    # A rerun for the same edition picks up after the last committed ledger chunk
+    ledger = open_ledger(edition_id)
+    handled = ledger.completed()
+    subscribers = iter_subscribers(skip=handled, email_range=email_range)
+    if stop:
+        subscribers = takewhile(lambda _: not stop.is_set(), subscribers)
+    try:
+        report = deliver(subscribers, message_factory(compiled), on_result=ledger.record)
+    finally:
+        ledger.flush()
+    report["skipped"] = len(handled)
+    return report
+
+
+# --- Sharded fan-out -------------------------------------------------------
+
+def _send_shard(edition_id, compiled, leases, shard, worker):
+    """Send one shard while a background thread keeps its lease alive."""
+    stop, lost = threading.Event(), threading.Event()
+
+    def keep_lease():
+        while not stop.wait(LEASE_SECONDS / 3):
+            # Any failure counts as lost: the lease would expire while we kept sending
+            try:
+                renewed = leases.renew(shard, worker)
+                reason = "taken over"
+            except Exception as e:
+                renewed, reason = False, f"renewal failed: {e}"
+            if not renewed:
+                print(f"  ⚠️ Lost the lease on shard {shard} ({reason}), stopping")
+                lost.set()
+                return
+
+    threading.Thread(target=keep_lease, daemon=True).start()
+    report = None
+    try:
+        report = _send(edition_id, compiled, email_range=email_range(shard, leases.shards), stop=lost)
+    finally:
+        stop.set()
+        delivered, failed = (report["delivered"], report["failed"]) if report else (0, 0)
+        leases.release(shard, worker, delivered, failed, done=report is not None and not lost.is_set())
+    return report
+
+
+def shard_worker(edition_id: str, shards: int, local_workers: int):
+    """Worker process: claim and send shards until every shard is done or SHARD_WAIT runs out.
+
+    Shards leased by other workers are polled so an expired lease (crashed worker or
+    runner) gets taken over. Returns this worker's totals.
+    """
+    resend.api_key = os.getenv("RESEND_API_KEY")
+    # The API rate limit is per account, so local workers split it
+    mailer.REQUESTS_PER_SECOND /= local_workers
+    compiled = compile_email(load_edition())
+    leases = open_leases(edition_id, shards)
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+
+    totals = {"delivered": 0, "failed": 0, "failed_recipients": [], "batches": 0}
+    deadline = time.time() + SHARD_WAIT
+    while time.time() < deadline:
+        shard = leases.claim(worker)
+        if shard is None:
+            if all_done(leases.status(), shards):
+                break
+            time.sleep(min(5, LEASE_SECONDS / 3))
+            continue
+        print(f"  🧩 {worker}: sending shard {shard + 1}/{shards}")
+        report = _send_shard(edition_id, compiled, leases, shard, worker)
+        for key in ("delivered", "failed", "batches"):
+            totals[key] += report[key]
+        totals["failed_recipients"] += report["failed_recipients"]
+    return totals
+
+
+def _send_sharded(edition_id, shards, workers):
+    """Coordinator: run a local pool of shard workers, then report per-shard counts for the whole edition.
+
+    Several runners can call this for the same edition; they share the shard leases.
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    backfilled = backfill_email_keys()
+    if backfilled:
+        print(f"🔑 Added emailKey to {backfilled} subscriber(s)")
+
+    start = time.monotonic()
+    local = {"delivered": 0, "failed": 0, "failed_recipients": [], "batches": 0}
+    # spawn, not fork: gRPC clients (Firestore) must not be inherited across fork
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = [pool.submit(shard_worker, edition_id, shards, workers) for _ in range(workers)]
+        for future in futures:
+            try:
+                totals = future.result()
+            except Exception as e:
+                print(f"  ❌ Shard worker crashed: {e}")
+                continue
+            for key in local:
+                local[key] += totals[key]
+    elapsed = time.monotonic() - start
+
+    status = open_leases(edition_id, shards).status()
+    print(f"🧩 Shards for edition {edition_id}:")
+    for shard in range(shards):
+        data = status.get(shard, {})
+        print(f"  [{data.get('status', PENDING).upper():>7}] shard {shard + 1}/{shards}: "
+              f"{data.get('delivered', 0)} delivered, {data.get('failed', 0)} failed")
+    delivered = sum(data.get("delivered", 0) for data in status.values())
+    return {
+        "delivered": delivered,
+        "failed": sum(data.get("failed", 0) for data in status.values()),
+        "failed_recipients": local["failed_recipients"],
+        "batches": local["batches"],
+        "elapsed": elapsed,
+        "per_second": local["delivered"] / elapsed if elapsed > 0 else 0.0,
+        "skipped": 0,
+        "incomplete": sum(1 for shard in range(shards) if status.get(shard, {}).get("status") != DONE),
+    }
+
+
+def send_newsletter(shards: int = None, workers: int = None):
+    shards = shards or NEWSLETTER_SHARDS
+    workers = workers or NEWSLETTER_WORKERS or shards
+
     api_key = os.getenv("RESEND_API_KEY")
     if not api_key:
         print("❌ RESEND_API_KEY not set — skipping newsletter send")
@@ -286,46 +267,48 @@ def send_newsletter():
 
     resend.api_key = api_key
 
-    # 1. Verify content is fresh before sending
-    if not check_content_freshness():
+    # 1. Get today's edition in one batched read
+    edition = load_edition()
+    print("📰 Fetched daily content from Firestore")
+
+    # 2. Verify content is fresh before sending
+    if not check_content_freshness(edition):
         print("🚫 Newsletter NOT sent — content is outdated. Check the content generation job.")
         sys.exit(1)
 
-    # 2. Get subscribers
-    subscribers = get_subscribers()
-    if not subscribers:
-        print("⚠️ No subscribers found — skipping")
+    # 3. Render the edition's sections once; per-subscriber copies only fill the slots
+    compiled = compile_email(edition)
+    print(f"📏 Email size: {format_size_report(compiled.size_report)}")
+
+    # 4. Stream subscribers straight into Resend's batch endpoint, one process or many shards
+    edition_id = date.today().isoformat()
+    if shards > 1:
+        print(f"🧩 Sharded send: {shards} shard(s), {workers} local worker process(es)")
+        report = _send_sharded(edition_id, shards, workers)
+    else:
+        report = _send(edition_id, compiled)
+        if report["skipped"]:
+            print(f"↩️ Resumed edition {edition_id}: {report['skipped']} recipient(s) already handled")
+
+    if report["delivered"] + report["failed"] == 0 and not report.get("incomplete"):
+        print("✅ Every subscriber already has this edition" if report["skipped"] else "⚠️ No subscribers found — skipping")
         return
 
-    print(f"📬 Found {len(subscribers)} subscriber(s)")
-
-    # 3. Get today's content
-    content = get_daily_content()
-    print("📰 Fetched daily content from Firestore")
-
-    # 4. Build email
-    html = build_email_html(content)
-    today = datetime.now().strftime("%B %d, %Y")
+    print(f"📬 Sent to {report['delivered'] + report['failed']} unique subscriber(s)")
+    for subscriber, reason in report["failed_recipients"]:
+        print(f"  ❌ Failed to send to {subscriber.email}: {reason}")
 
-    # 5. Send via Resend
-    # Send individually to keep subscriber emails private (no CC/BCC exposure)
-    success = 0
-    failed = 0
-    for email in subscribers:
-        try:
-            resend.Emails.send({
-                "from": "The Keele Street Journal <newsletter@theksj.com>",
-                "to": [email],
-                "subject": f"KSJ Morning Edition — {today}",
-                "html": html,
-            })
-            success += 1
-        except Exception as e:
-            print(f"  ❌ Failed to send to {email}: {e}")
-            failed += 1
-
-    print(f"✅ Newsletter sent: {success} delivered, {failed} failed")
+    print(f"✅ Newsletter sent: {report['delivered']} delivered, {report['failed']} failed "
+          f"({report['batches']} batches, {report['per_second']:.1f} msg/s)")
+    if report.get("incomplete"):
+        print(f"❌ {report['incomplete']} shard(s) unfinished — rerun to resume them")
+        sys.exit(1)
 
 
 if __name__ == "__main__":
-    send_newsletter()
+    import argparse
+    parser = argparse.ArgumentParser(description="Send today's newsletter.")
+    parser.add_argument("--shards", type=int, default=None, help="split subscribers into N lease-based shards")
+    parser.add_argument("--workers", type=int, default=None, help="local worker processes (default: one per shard)")
+    args = parser.parse_args()
+    send_newsletter(args.shards, args.workers)
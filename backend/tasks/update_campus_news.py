@@ -1,22 +1,16 @@
-import feedparser
-import google.generativeai as genai
 import os
 import sys
 import json
-import re
 from dotenv import load_dotenv
-from firebase_admin import firestore
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from app.db import db
-from app.image_utils import get_image_with_fallback
+from app.db import FINGERPRINT_FIELD, SERVER_TIMESTAMP, fingerprint, publish_section, reuse_if_unchanged
+from app.image_utils import get_images_with_fallback
+from app.scraper import entry_key, fetch_feeds
+from app.genai_engine import JSON_CONFIG, candidate_index, clip_tokens, generate, pack_candidates
 
 load_dotenv()
 
-GEN_KEY = os.getenv("GEMINI_API_KEY")
-genai.configure(api_key=GEN_KEY)
-model = genai.GenerativeModel('gemini-flash-latest')
-
 RSS_URLS = [
     "https://www.yorku.ca/yfile/feed/",
     "https://news.yorku.ca/feed/",
@@ -24,14 +18,11 @@ RSS_URLS = [
 
 def fetch_and_curate():
     print("   📡 Scanning York U Feeds...")
-    USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7)..."
-    
     # 1. Fetch ALL raw candidates first
     candidates = []
-    for url in RSS_URLS:
+    for url, entries in fetch_feeds(RSS_URLS, limit=6).items(): # Check top 6
         try:
-            feed = feedparser.parse(url, agent=USER_AGENT)
-            for entry in feed.entries[:6]: # Check top 6
+            for entry in entries:
                 # Get Author
                 author = getattr(entry, 'author', 'Staff')
                 if "(" in author: author = author.split("(")[1].replace(")", "")
@@ -39,55 +30,68 @@ def fetch_and_curate():
                 candidates.append({
                     "title": entry.title,
                     "link": entry.link,
-                    "summary": re.sub(r'<[^>]+>', '', entry.summary)[:200],
+                    "summary": clip_tokens(entry.summary, 50),
                     "image": None,  # Will be resolved after AI selection
                     "author": author,
                     "_entry": entry,  # Keep entry for image extraction later
                 })
         except Exception as e:
             print(f"      ❌ Feed error: {e}")
-            
+
+    # yFile often goes days without a new post: reuse the last selection
+    inputs = fingerprint([entry_key(c["_entry"]) for c in candidates])
+    if reuse_if_unchanged("campus", inputs):
+        return
+
     # 2. Ask AI to pick the Top 4
     print("   🧠 AI Editor is selecting the best 4 stories...")
-    # Strip non-serializable _entry before passing to AI
-    candidates_for_ai = [{k: v for k, v in c.items() if k != "_entry"} for c in candidates]
-    candidates_str = json.dumps(candidates_for_ai)
+    # Only what the model needs to choose: links, images and raw entries are re-attached by id
+    candidates_str, _ = pack_candidates("campus", list(enumerate(candidates)), lambda pair: json.dumps({
+        "id": pair[0], "title": pair[1]["title"], "summary": pair[1]["summary"], "author": pair[1]["author"],
+    }), separator=",\n")
     
     prompt = f"""
     You are the Campus Editor.
-    Raw Articles: {candidates_str}
+    Raw Articles: [{candidates_str}]
     
     TASK:
     1. Select the best 3 stories for students.
-    2. Keep all fields (link, image, author) exactly as is.
-    3. If 'image' is null, keep it null (we will fix it later).
+    2. Keep all fields (id, title, summary, author) exactly as is.
 
     OUTPUT JSON Array: [ {{ ... }} ]
     """
 
     selected_stories = []
     try:
-        res = model.generate_content(prompt, generation_config={"response_mime_type": "application/json"})
-        selected_stories = json.loads(res.text)
+        selected_stories = json.loads(generate(prompt, JSON_CONFIG))
     except Exception as e:
         print(f"❌ AI Selection Failed: {e}")
         return
 
     # 3. Resolve images for the 3 winners using shared image utils
-    # Build a lookup from title to original entry for image extraction
-    entry_lookup = {c["title"]: c.get("_entry") for c in candidates}
+    indexes = [candidate_index(story, len(candidates)) for story in selected_stories]
+    indexes = list(dict.fromkeys(i for i in indexes if i is not None))[:3]
+    if not indexes:
+        print(f"   ⚠️ None of the {len(selected_stories)} picks matched a candidate id, nothing to publish.")
+        return
+    picked = [candidates[i] for i in indexes]
 
     final_items = []
-    for story in selected_stories[:3]:
-        entry = entry_lookup.get(story.get("title"))
-        story["image"] = get_image_with_fallback(entry, story["title"], category="campus", validate=True)
+    images = get_images_with_fallback(
+        [(c["_entry"], c["title"], "campus") for c in picked],
+        validate=True,
+    )
+    for c, image_url in zip(picked, images):
+        story = {k: v for k, v in c.items() if k != "_entry"}
+        story["image"] = image_url
         final_items.append(story)
         
     # 4. Save
     if final_items:
-        db.collection("daily_edition").document("campus_news").set({
-            "lastUpdated": firestore.SERVER_TIMESTAMP,
-            "items": final_items
+        publish_section("campus", {
+            "lastUpdated": SERVER_TIMESTAMP,
+            "items": final_items,
+            FINGERPRINT_FIELD: inputs,
         })
         print("💾 Campus News Published.")
 
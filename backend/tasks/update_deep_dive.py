@@ -1,22 +1,17 @@
-import yfinance as yf
-import google.generativeai as genai
 import os
 import sys
 import json
 from dotenv import load_dotenv
-from firebase_admin import firestore
 
 # Setup path to import 'app.db'
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from app.db import db
+from app.db import FINGERPRINT_FIELD, SERVER_TIMESTAMP, fingerprint, publish_section, reuse_if_unchanged
+from app.market_data import get_snapshot
+from app.market_history import period_change
+from app.genai_engine import JSON_CONFIG, generate
 
 load_dotenv()
 
-# Configure Gemini
-GEN_KEY = os.getenv("GEMINI_API_KEY")
-genai.configure(api_key=GEN_KEY)
-model = genai.GenerativeModel('gemini-flash-latest')
-
 def fetch_macro_data():
     """Fetches key economic indicators for analysis."""
     print("   📊 Fetching macro indicators...")
@@ -32,22 +27,19 @@ def fetch_macro_data():
     data_summary = []
     
     try:
-        # Fetch all at once
-        data = yf.download(list(tickers.values()), period="5d", progress=False)
+        # Fetch all at once (reuses the ticker's quotes when run in the same pipeline)
+        snapshot = get_snapshot(list(tickers.values()))
         
         for name, symbol in tickers.items():
-            try:
-                # Get latest close
-                ticker = yf.Ticker(symbol)
-                info = ticker.fast_info
-                price = info.last_price
-                prev = info.previous_close
-                
-                if price and prev:
-                    change_pct = ((price - prev) / prev) * 100
-                    data_summary.append(f"{name}: {price:,.2f} (Change: {change_pct:+.2f}%)")
-            except:
-                continue
+            quote = snapshot.get(symbol)
+            if quote:
+                line = f"{name}: {quote['price']:,.2f} (Change: {quote['change_pct']:+.2f}%"
+                # Multi-week context comes from the local history store, no extra download
+                for label, days in (("1W", 7), ("1M", 30), ("3M", 91)):
+                    pct = period_change(symbol, days)
+                    if pct is not None:
+                        line += f", {label}: {pct:+.2f}%"
+                data_summary.append(line + ")")
                 
         return "\n".join(data_summary)
     except Exception as e:
@@ -102,8 +94,7 @@ def generate_analysis(macro_text):
     """
     
     try:
-        response = model.generate_content(prompt, generation_config={"response_mime_type": "application/json"})
-        return response.text
+        return generate(prompt, JSON_CONFIG)
     except Exception as e:
         print(f"      ❌ AI Error: {e}")
         return None
@@ -117,6 +108,11 @@ def update_deep_dive():
         print("❌ Failed to fetch macro data.")
         return
 
+    # The rounded snapshot only repeats when markets were closed since the last run
+    inputs = fingerprint(macro_data)
+    if reuse_if_unchanged("deep_dive", inputs):
+        return
+
     # 2. Analyze with AI
     json_str = generate_analysis(macro_data)
     
@@ -125,12 +121,13 @@ def update_deep_dive():
         try:
             data = json.loads(json_str)
             
-            db.collection("daily_edition").document("deep_dive").set({
-                "lastUpdated": firestore.SERVER_TIMESTAMP,
+            publish_section("deep_dive", {
+                "lastUpdated": SERVER_TIMESTAMP,
                 "cards": data.get("cards", []),
-                "stat": data.get("stat", {})
+                "stat": data.get("stat", {}),
+                FINGERPRINT_FIELD: inputs,
             })
-            print("💾 Deep Dive Published: Saved to 'daily_edition/deep_dive'")
+            print("💾 Deep Dive Published.")
             
         except json.JSONDecodeError:
             print("❌ AI returned invalid JSON.")
@@ -2,13 +2,15 @@ import os
 import sys
 import json
 import datetime
-from firebase_admin import firestore
+from concurrent.futures import ThreadPoolExecutor
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from app.db import db
-from app.genai_engine import generate_json
-from app.scraper import fetch_feed
+from app.db import FINGERPRINT_FIELD, SERVER_TIMESTAMP, fingerprint, publish_section, reuse_if_unchanged
+from app.dedupe import coverage_note, dedupe, entry_text
+from app.genai_engine import candidate_index, clip_tokens, pack_candidates, stream_json_items
+from app.scraper import entry_key, fetch_feeds
 from app.image_utils import get_image_with_fallback
+from app.spans import bind
 
 # Multiple RSS sources for diverse featured stories
 FEEDS = [
@@ -23,29 +25,43 @@ def update_featured_stories():
     print("📰 Starting 'Featured Stories' production...")
 
     # 1. Gather candidates from all feeds
-    candidates = []
     raw_entries = []  # Keep raw entries for image extraction
-    for url in FEEDS:
-        entries = fetch_feed(url, limit=3)
+    sources = []
+    for url, entries in fetch_feeds(FEEDS, limit=3).items():
         for entry in entries:
-            candidates.append({
-                "title": entry.get("title", ""),
-                "summary": getattr(entry, "summary", ""),
-                "source": url.split("/")[2],
-            })
             raw_entries.append(entry)
+            sources.append(url.split("/")[2])
 
-    if not candidates:
+    if not raw_entries:
         print("   ❌ No RSS candidates found.")
         return
 
-    print(f"   📡 Collected {len(candidates)} candidates from {len(FEEDS)} feeds.")
+    print(f"   📡 Collected {len(raw_entries)} candidates from {len(FEEDS)} feeds.")
 
-    # 2. Build candidate text for AI
-    candidates_text = "\n".join(
-        f"{i+1}. [{c['source']}] {c['title']} — {c['summary'][:120]}"
-        for i, c in enumerate(candidates)
-    )
+    # Same candidates as the last edition: skip the model and the image checks
+    inputs = fingerprint([entry_key(entry) for entry in raw_entries])
+    if reuse_if_unchanged("featured", inputs):
+        return
+
+    # The same story from several outlets goes to the model once, with its coverage count
+    clusters = dedupe(list(zip(raw_entries, sources)), text=lambda pair: entry_text(pair[0]))
+    candidates = [{
+        "title": entry.get("title", ""),
+        "summary": entry.get("summary", ""),
+        "source": source,
+        "coverage": size,
+        "entry": entry,
+    } for (entry, source), size in clusters]
+    if len(candidates) < len(raw_entries):
+        print(f"   🧹 Merged {len(raw_entries)} candidates into {len(candidates)} distinct stories.")
+
+    # 2. Build candidate text for AI: most widely covered first, within the section's token budget
+    candidates.sort(key=lambda c: -c["coverage"])
+    candidates_text, packed = pack_candidates("featured", list(enumerate(candidates)), lambda pair: (
+        f"{pair[0]}. [{pair[1]['source']}] {clip_tokens(pair[1]['title'], 40)}{coverage_note(pair[1]['coverage'])}"
+        f" — {clip_tokens(pair[1]['summary'], 30)}"
+    ))
+    candidates = [c for _, c in packed]
 
     today = datetime.date.today().strftime("%b %d, %Y")
 
@@ -57,15 +73,18 @@ def update_featured_stories():
 
     TASK:
     1. Select the 4 most diverse and impactful stories. Avoid picking two stories about the same topic.
-    2. Assign each a category from: "Markets", "Economy", "Policy", "Tech", "Global Trade", "Energy", "Banking".
-    3. Write a punchy, short title (max 12 words) and a one-sentence summary for each.
-    4. Write 3 paragraphs of article content for each story (informative, suitable for economics students).
-    5. Write 2-3 key takeaway points for each story.
+       Stories covered by several outlets are usually the most important.
+    2. Give each story's candidate number (the number before its line) as "candidate".
+    3. Assign each a category from: "Markets", "Economy", "Policy", "Tech", "Global Trade", "Energy", "Banking".
+    4. Write a punchy, short title (max 12 words) and a one-sentence summary for each.
+    5. Write 3 paragraphs of article content for each story (informative, suitable for economics students).
+    6. Write 2-3 key takeaway points for each story.
 
     OUTPUT FORMAT (JSON array):
     [
         {{
             "id": "featured-0",
+            "candidate": 3,
             "category": "Markets",
             "title": "Short Punchy Title Here",
             "summary": "One clear sentence summarizing the story.",
@@ -78,29 +97,45 @@ def update_featured_stories():
     ]
     """
 
-    result = generate_json(prompt)
+    # Stream the stories: each one's image is resolved while the next is still being written
+    image_pool = ThreadPoolExecutor(max_workers=4)
+    image_futures = []
+
+    def resolve_image(item, index):
+        if index >= 4:
+            return
+        # The model rewrites titles, so the story is matched to its feed entry by candidate number
+        index = candidate_index(item, len(candidates), key="candidate")
+        matching_entry = candidates[index]["entry"] if index is not None else None
+        image_futures.append(image_pool.submit(
+            bind(get_image_with_fallback), matching_entry, item.get("title", ""), item.get("category"), True
+        ))
+
+    result = stream_json_items(prompt, on_item=resolve_image)
 
     if not result or not isinstance(result, list):
+        image_pool.shutdown(wait=False)
         print("   ❌ AI failed to generate featured stories.")
         return
 
-    # Ensure correct IDs and resolve images
-    # Build lookup from candidate title to raw entry for image extraction
-    entry_lookup = {c["title"]: raw_entries[i] for i, c in enumerate(candidates) if i < len(raw_entries)}
-
-    for i, item in enumerate(result[:4]):
+    # Ensure correct IDs and attach resolved images
+    for i, (item, future) in enumerate(zip(result[:4], image_futures)):
         item["id"] = f"featured-{i}"
-        # Find matching entry by title similarity
-        matching_entry = entry_lookup.get(item.get("title"))
-        item["imageUrl"] = get_image_with_fallback(matching_entry, item["title"], category=item.get("category"), validate=True)
+        item.pop("candidate", None)
+        item["imageUrl"] = future.result()
+    image_pool.shutdown()
 
     # 3. Save to Firestore
+    data = {
+        "lastUpdated": SERVER_TIMESTAMP,
+        "items": result[:4],
+    }
+    # A cut-short stream must not be reused, so it gets no fingerprint
+    if len(result) >= 4:
+        data[FINGERPRINT_FIELD] = inputs
     try:
-        db.collection("daily_edition").document("featured_stories").set({
-            "lastUpdated": firestore.SERVER_TIMESTAMP,
-            "items": result[:4]
-        })
-        print(f"   💾 Saved {len(result[:4])} featured stories to Firestore.")
+        publish_section("featured", data)
+        print(f"   💾 Saved {len(result[:4])} featured stories.")
     except Exception as e:
         print(f"   ❌ Database Error: {e}")
 
@@ -1,26 +1,17 @@
-import feedparser
-import google.generativeai as genai
 import os
 import sys
 import json
 from dotenv import load_dotenv
-from firebase_admin import firestore
 
 # Setup path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from app.db import db
+from app.db import FINGERPRINT_FIELD, SERVER_TIMESTAMP, fingerprint, publish_section, reuse_if_unchanged
+from app.dedupe import coverage_note, dedupe
+from app.scraper import fetch_feeds
+from app.genai_engine import JSON_CONFIG, clip_tokens, generate, pack_candidates
 
 load_dotenv()
 
-# Configure Gemini
-GEN_KEY = os.getenv("GEMINI_API_KEY")
-genai.configure(api_key=GEN_KEY)
-
-# ---------------------------------------------------------
-# CRITICAL UPDATE: Using the correct model name you verified
-# ---------------------------------------------------------
-model = genai.GenerativeModel('gemini-flash-latest')
-
 # Global Macro Sources
 RSS_URLS = [
     "https://www.aljazeera.com/xml/rss/all.xml", # Excellent global coverage
@@ -30,20 +21,18 @@ RSS_URLS = [
 
 def fetch_global_raw():
     print("   📡 Scanning global feeds...")
-    USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) Chrome/120.0.0.0"
-    
-    combined_headlines = []
-    
-    for url in RSS_URLS:
-        try:
-            feed = feedparser.parse(url, agent=USER_AGENT)
-            # Take top 3 from each to get a mix
-            for entry in feed.entries[:3]:
-                combined_headlines.append(f"Title: {entry.title}\nSummary: {entry.summary[:200]}...")
-        except Exception as e:
-            print(f"      ⚠️ Failed to read {url}: {e}")
-            
-    return "\n\n".join(combined_headlines)
+    # Take top 3 from each to get a mix (all feeds fetched concurrently)
+    all_entries = [entry for entries in fetch_feeds(RSS_URLS, limit=3).values() for entry in entries]
+
+    # A story carried by several outlets is listed once with its coverage count, most widely covered first
+    ranked = sorted(dedupe(all_entries), key=lambda cluster: -cluster[1])
+    raw_text, _ = pack_candidates("global_briefing", ranked, render_entry, separator="\n\n")
+    return raw_text
+
+def render_entry(cluster):
+    entry, size = cluster
+    return (f"Title: {clip_tokens(entry.get('title'), 40)}{coverage_note(size)}\n"
+            f"Summary: {clip_tokens(entry.get('summary'), 50)}")
 
 def analyze_briefing(raw_text):
     print("   🧠 AI Editor is curating the Global Briefing...")
@@ -57,7 +46,8 @@ def analyze_briefing(raw_text):
     TASK:
     1. Select the top 3 most critical geopolitical/economic stories.
     2. Ignore sports, celebrity news, or local crime. Focus on MACRO impact (trade, war, policy).
-    3. Output a valid JSON array.
+    3. Stories covered by several outlets are usually the most important.
+    4. Output a valid JSON array.
     
     OUTPUT FORMAT (JSON):
     [
@@ -70,8 +60,7 @@ def analyze_briefing(raw_text):
     """
     
     try:
-        response = model.generate_content(prompt, generation_config={"response_mime_type": "application/json"})
-        return response.text
+        return generate(prompt, JSON_CONFIG)
     except Exception as e:
         print(f"      ❌ AI Error: {e}")
         return "[]"
@@ -85,6 +74,10 @@ def update_global():
         print("❌ No data found.")
         return
 
+    inputs = fingerprint(raw_text)
+    if reuse_if_unchanged("global_briefing", inputs):
+        return
+
     # 2. Analyze
     json_str = analyze_briefing(raw_text)
     
@@ -92,11 +85,12 @@ def update_global():
     try:
         data = json.loads(json_str)
         if len(data) > 0:
-            db.collection("daily_edition").document("global_briefing").set({
-                "lastUpdated": firestore.SERVER_TIMESTAMP,
-                "items": data
+            publish_section("global_briefing", {
+                "lastUpdated": SERVER_TIMESTAMP,
+                "items": data,
+                FINGERPRINT_FIELD: inputs,
             })
-            print("💾 Global Briefing Published: Saved to 'daily_edition/global_briefing'")
+            print("💾 Global Briefing Published.")
         else:
             print("⚠️ AI returned empty list.")
             
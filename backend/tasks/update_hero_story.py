@@ -1,59 +1,58 @@
-import feedparser
-import google.generativeai as genai
 import os
 import sys
-import json
 from dotenv import load_dotenv
-from firebase_admin import firestore
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from app.db import db
+from app.db import FINGERPRINT_FIELD, SERVER_TIMESTAMP, fingerprint, publish_section, reuse_if_unchanged
 from app.image_utils import get_image_with_fallback
+from app.scraper import entry_key, fetch_feed
+from app.genai_engine import clip_tokens, generate_json, prompt_budget
 
 load_dotenv()
 
-GEN_KEY = os.getenv("GEMINI_API_KEY")
-genai.configure(api_key=GEN_KEY)
-model = genai.GenerativeModel('gemini-flash-latest')
-
 # Financial Post (Good for both Lead and Featured stories)
 RSS_URL = "https://financialpost.com/feed"
 
 def update_hero_and_featured():
     print("📰 Starting 'Hero & Featured' production...")
     
-    USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7)"
-    feed = feedparser.parse(RSS_URL, agent=USER_AGENT)
+    entries = fetch_feed(RSS_URL, limit=1)
     
-    if not feed.entries:
+    if not entries:
         print("❌ Could not fetch RSS feed.")
         return
 
     # --- 1. PROCESS HERO (Story #1) ---
-    hero_entry = feed.entries[0]
+    hero_entry = entries[0]
     print(f"   ⭐️ Hero found: {hero_entry.title[:30]}...")
+
+    inputs = fingerprint([entry_key(hero_entry), hero_entry.get("summary")])
+    if reuse_if_unchanged("hero", inputs):
+        return
     
     hero_prompt = f"""
     You are the Editor-in-Chief.
     Task: Write a "Special Report" based on this news.
     Headline: {hero_entry.title}
-    Summary: {hero_entry.summary}
+    Summary: {clip_tokens(hero_entry.get("summary"), prompt_budget("hero"))}
     
     Output JSON: {{ "title": "...", "subtitle": "...", "content": ["para1", "para2", "para3"], "keyPoints": ["pt1", "pt2"] }}
     """
     
     try:
         # Generate Hero
-        hero_res = model.generate_content(hero_prompt, generation_config={"response_mime_type": "application/json"})
-        hero_data = json.loads(hero_res.text)
+        hero_data = generate_json(hero_prompt)
+        if not hero_data:
+            raise ValueError("AI returned no hero story")
         
         # Save Hero
-        db.collection("daily_edition").document("hero_story").set({
-            "lastUpdated": firestore.SERVER_TIMESTAMP,
+        publish_section("hero", {
+            "lastUpdated": SERVER_TIMESTAMP,
             "type": "hero",
             "imageUrl": get_image_with_fallback(hero_entry, hero_data.get("title", hero_entry.title), validate=True),
             **hero_data,
-            "author": "The Editorial Board"
+            "author": "The Editorial Board",
+            FINGERPRINT_FIELD: inputs,
         })
         print("   💾 Saved Hero Story.")
         
@@ -1,10 +1,9 @@
 import os
 import sys
-from firebase_admin import firestore
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from app.db import db
-from app.genai_engine import generate_json
+from app.db import FINGERPRINT_FIELD, SERVER_TIMESTAMP, fingerprint, publish_section, reuse_if_unchanged
+from app.genai_engine import pack_candidates, stream_json_items
 from app.scraper import fetch_headlines
 
 # Reuse the same news sources as whats_news for context
@@ -19,12 +18,17 @@ def update_opinions():
     print("📝 Starting 'Opinion Column' production...")
 
     # 1. Fetch today's headlines for context
-    headlines = fetch_headlines(HEADLINE_FEEDS, limit_per_feed=4)
+    headlines, _ = pack_candidates("opinions", fetch_headlines(HEADLINE_FEEDS, limit_per_feed=4).splitlines(),
+                                   lambda line: line)
 
     if not headlines:
         print("   ⚠️ No headlines found. Using generic prompt.")
         headlines = "Global markets, trade policy, student economics, and technology trends."
 
+    inputs = fingerprint(headlines)
+    if reuse_if_unchanged("opinions", inputs):
+        return
+
     # 2. Ask Gemini to generate 5 opinion columns
     prompt = f"""
     You are the Opinion Editor of 'The Keele Street Journal', an economics newspaper for York University students.
@@ -69,19 +73,24 @@ def update_opinions():
     ]
     """
 
-    result = generate_json(prompt)
+    # Streamed so a truncated response still keeps the columns already written
+    result = stream_json_items(prompt)
 
     if not result or not isinstance(result, list):
         print("   ❌ AI failed to generate opinions.")
         return
 
     # 3. Save to Firestore
+    data = {
+        "lastUpdated": SERVER_TIMESTAMP,
+        "items": result[:5],
+    }
+    # A cut-short stream must not be reused, so it gets no fingerprint
+    if len(result) >= 5:
+        data[FINGERPRINT_FIELD] = inputs
     try:
-        db.collection("daily_edition").document("opinions").set({
-            "lastUpdated": firestore.SERVER_TIMESTAMP,
-            "items": result[:5]
-        })
-        print(f"   💾 Saved {len(result[:5])} opinion pieces to Firestore.")
+        publish_section("opinions", data)
+        print(f"   💾 Saved {len(result[:5])} opinion pieces.")
     except Exception as e:
         print(f"   ❌ Database Error: {e}")
 
@@ -1,13 +1,11 @@
-import yfinance as yf
-import firebase_admin
-from firebase_admin import firestore
 import sys
 import os
 
 # Add the parent directory to path so we can import 'app.db'
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from app.db import db  # Imports your authenticated Firestore client
+from app.db import SERVER_TIMESTAMP, publish_section
+from app.market_data import get_snapshot
 
 def update_market_data():
     print("📈 Fetching market data...")
@@ -24,25 +22,20 @@ def update_market_data():
     market_data = []
 
     try:
-        # Fetch all data at once
-        data = yf.download(list(tickers.values()), period="1d", progress=False)
+        # Fetch all data at once (shared snapshot, failed symbols retried individually)
+        snapshot = get_snapshot(list(tickers.values()))
 
-        # ... inside update_market_data function ...
-        
         # Use a more reliable ticker for Oil if CL=F fails often: "CL=F" (Future) or "USO" (ETF)
         # For now, we will stick with CL=F but handle the error gracefully.
         
         for name, symbol in tickers.items():
             try:
-                ticker_obj = yf.Ticker(symbol)
-                
-                # Fast fetch using 'fast_info' (newer yfinance feature, more reliable)
-                price = ticker_obj.fast_info.last_price
-                prev_close = ticker_obj.fast_info.previous_close
+                quote = snapshot.get(symbol)
                 
-                if price and prev_close:
-                    change = price - prev_close
-                    percent_change = (change / prev_close) * 100
+                if quote:
+                    price = quote["price"]
+                    change = quote["change"]
+                    percent_change = quote["change_pct"]
                     is_up = change >= 0
                     
                     market_data.append({
@@ -61,11 +54,11 @@ def update_market_data():
         # Save to Firestore
         # We store this in a 'system' collection, document 'market_data'
         if market_data:
-            db.collection("system").document("market_ticker").set({
-                "lastUpdated": firestore.SERVER_TIMESTAMP,
+            publish_section("ticker", {
+                "lastUpdated": SERVER_TIMESTAMP,
                 "items": market_data
             })
-            print("💾 Successfully updated Firestore 'system/market_ticker'")
+            print("💾 Market Ticker Published.")
         else:
             print("⚠️ No data collected to save.")
 
@@ -1,29 +1,16 @@
-import feedparser
-import google.generativeai as genai
 import os
 import sys
 from dotenv import load_dotenv
-from firebase_admin import firestore
 
 # Setup path to import 'app.db'
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from app.db import db
+from app.db import FINGERPRINT_FIELD, SERVER_TIMESTAMP, fingerprint, publish_section, reuse_if_unchanged
+from app.dedupe import coverage_note, dedupe
+from app.scraper import fetch_feeds
+from app.genai_engine import MODEL_NAME, clip_tokens, generate_many, pack_candidates
 
 load_dotenv()
 
-# Configure Gemini
-GEN_KEY = os.getenv("GEMINI_API_KEY")
-if not GEN_KEY:
-    print("❌ Error: GEMINI_API_KEY not found in .env")
-    sys.exit(1)
-
-genai.configure(api_key=GEN_KEY)
-
-# Use the latest experimental Flash model (Gemini 2.0)
-# If this fails, fallback to 'gemini-1.5-flash-latest'
-MODEL_NAME = 'gemini-flash-latest' 
-model = genai.GenerativeModel(MODEL_NAME)
-
 # Define our News Sources (RSS)
 FEEDS = {
     "business": [
@@ -39,96 +26,116 @@ FEEDS = {
 def fetch_headlines(category):
     """Parses RSS feeds and returns a simple list of strings."""
     print(f"   📡 Fetching {category} news...")
-    headlines = []
-    
-    # Fake a browser User-Agent to prevent blocking (Fixes CBC error)
-    USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-    
-    for url in FEEDS[category]:
-        try:
-            # Pass the agent to feedparser
-            feed = feedparser.parse(url, agent=USER_AGENT)
-            
-            if feed.bozo and feed.bozo_exception:
-                print(f"      ⚠️ Feed warning for {url}: {feed.bozo_exception}")
-
-            # Take top 5 from each feed
-            for entry in feed.entries[:5]:
-                headlines.append(f"- {entry.title}")
-                
-        except Exception as e:
-            print(f"      ⚠️ Error reading feed {url}: {e}")
-            
-    return "\n".join(headlines)
+    # All of the category's feeds are fetched concurrently through the shared feed cache
+    # Take top 5 from each feed
+    all_entries = [entry for entries in fetch_feeds(FEEDS[category], limit=5).values() for entry in entries]
 
-def summarize_with_ai(headlines, category):
-    """Asks Gemini to write the WSJ-style bullets."""
-    print(f"   🧠 AI Editor ({MODEL_NAME}) is summarizing {category}...")
-    
-    prompt = f"""
+    # Both feeds often carry the same story: list it once with its coverage count,
+    # most widely covered first, within the section's prompt budget
+    ranked = sorted(dedupe(all_entries), key=lambda cluster: -cluster[1])
+    headlines, _ = pack_candidates(
+        "whats_news", ranked,
+        lambda cluster: f"- {clip_tokens(cluster[0].get('title'), 40)}{coverage_note(cluster[1])}",
+    )
+    return headlines
+
+# Return fallback dummy data so the app doesn't break if AI fails
+FALLBACK_BULLETS = [
+    "- AI Generation failed. Please check API quota.",
+    "- Ensure your Google AI Studio key has access to Gemini 2.0.",
+    "- Fallback: Markets open mixed as investors digest new data.",
+    "- Fallback: Global trade tensions remain high."
+]
+
+def build_prompt(headlines):
+    return f"""
     You are the Senior Editor of 'The Keele Street Journal'.
     
     Raw Headlines:
     {headlines}
     
     Task:
-    1. Select the 4 most important stories.
+    1. Select the 4 most important stories (those covered by several outlets usually matter most).
     2. Rewrite them into a single, punchy sentence each.
     3. Style: Professional, dense, "Wall Street Journal" style.
     4. Start each bullet with "- ".
     5. Output ONLY the 4 bullets.
     """
+
+def parse_bullets(text):
+    clean_text = text.replace("*", "").strip()
+    bullets = [line.strip() for line in clean_text.split('\n') if line.strip().startswith("-")]
     
-    try:
-        response = model.generate_content(prompt)
-        clean_text = response.text.replace("*", "").strip()
-        bullets = [line.strip() for line in clean_text.split('\n') if line.strip().startswith("-")]
+    if not bullets:
+        bullets = [line.strip() for line in clean_text.split('\n') if line.strip()]
         
-        if not bullets:
-            bullets = [line.strip() for line in clean_text.split('\n') if line.strip()]
-            
-        return bullets[:4]
-        
-    except Exception as e:
-        print(f"      ❌ AI Error: {e}")
-        # Return fallback dummy data so the app doesn't break if AI fails
-        return [
-            "- AI Generation failed. Please check API quota.",
-            "- Ensure your Google AI Studio key has access to Gemini 2.0.",
-            "- Fallback: Markets open mixed as investors digest new data.",
-            "- Fallback: Global trade tensions remain high."
-        ]
+    return bullets[:4]
+
+def summarize_with_ai(headlines, category):
+    """Asks Gemini to write the WSJ-style bullets."""
+    return summarize_all({category: headlines})[category]
+
+def summarize_all(raw_by_category):
+    """Summarizes every category concurrently. Returns {category: bullets}."""
+    for category in raw_by_category:
+        print(f"   🧠 AI Editor ({MODEL_NAME}) is summarizing {category}...")
+    
+    prompts = [build_prompt(headlines) for headlines in raw_by_category.values()]
+    results = generate_many(prompts)
+    
+    summaries = {}
+    for category, (text, error) in zip(raw_by_category, results):
+        if error:
+            print(f"      ❌ AI Error ({category}): {error}")
+            summaries[category] = FALLBACK_BULLETS
+        else:
+            summaries[category] = parse_bullets(text)
+    return summaries
 
 def update_news():
     print("📰 Starting 'What's News' aggregation...")
     
-    # 1. Fetch & Summarize Business
+    # Warm the feed cache for both categories in one concurrent round
+    fetch_feeds(FEEDS["business"] + FEEDS["world"])
+    
+    # 1. Fetch Business & World
     raw_business = fetch_headlines("business")
     if not raw_business:
         print("   ⚠️ No business headlines found.")
-        business_bullets = []
-    else:
-        business_bullets = summarize_with_ai(raw_business, "Business & Finance")
     
-    # 2. Fetch & Summarize World
     raw_world = fetch_headlines("world")
     if not raw_world:
         print("   ⚠️ No world headlines found.")
-        world_bullets = []
-    else:
-        world_bullets = summarize_with_ai(raw_world, "Global Politics")
+
+    # Same headlines as the last edition: keep its bullets
+    inputs = fingerprint([raw_business, raw_world])
+    if reuse_if_unchanged("whats_news", inputs):
+        return
+
+    # 2. Summarize both at once
+    to_summarize = {}
+    if raw_business:
+        to_summarize["Business & Finance"] = raw_business
+    if raw_world:
+        to_summarize["Global Politics"] = raw_world
+    summaries = summarize_all(to_summarize) if to_summarize else {}
+    business_bullets = summaries.get("Business & Finance", [])
+    world_bullets = summaries.get("Global Politics", [])
 
     # 3. Save to Firestore
     if business_bullets and world_bullets:
         data = {
-            "lastUpdated": firestore.SERVER_TIMESTAMP,
+            "lastUpdated": SERVER_TIMESTAMP,
             "business": business_bullets,
             "world": world_bullets
         }
+        # Fallback bullets must not be reused, so they get no fingerprint
+        if FALLBACK_BULLETS not in (business_bullets, world_bullets):
+            data[FINGERPRINT_FIELD] = inputs
         
         try:
-            db.collection("daily_edition").document("whats_news").set(data)
-            print("💾 Edition Published: Saved to Firestore 'daily_edition/whats_news'")
+            publish_section("whats_news", data)
+            print("💾 What's News Published.")
         except Exception as e:
              print(f"❌ Database Error: {e}")
     else:
@@ -14,28 +14,42 @@ import { CurrentDate } from "@/components/current-date";
 import { SafeImage } from "@/components/safe-image";
 import { slugify } from "@/lib/utils";
 
+// Section key -> its per-section document, written before the consolidated edition existed
+const LEGACY_DOCS: Record<string, [string, string]> = {
+  ticker: ["system", "market_ticker"],
+  whats_news: ["daily_edition", "whats_news"],
+  hero: ["daily_edition", "hero_story"],
+  featured: ["daily_edition", "featured_stories"],
+  global_briefing: ["daily_edition", "global_briefing"],
+  deep_dive: ["daily_edition", "deep_dive"],
+  campus: ["daily_edition", "campus_news"],
+  opinions: ["daily_edition", "opinions"],
+};
+
+async function getLegacySections(keys: string[]) {
+  // Sections the consolidated edition doesn't have yet: one document per section
+  const docs = await Promise.all(
+    keys.map((key) => getDoc(doc(db, ...LEGACY_DOCS[key])).then((snap) => (snap.exists() ? snap.data() : null)))
+  );
+  return Object.fromEntries(keys.map((key, i) => [key, docs[i]]));
+}
+
 async function getDailyEdition() {
-  // Fetch ALL collections in parallel for speed
-  const [tickerSnap, newsSnap, heroSnap, featuredSnap, globalSnap, deepDiveSnap, campusSnap, opinionsSnap] = await Promise.all([
-    getDoc(doc(db, "system", "market_ticker")),
-    getDoc(doc(db, "daily_edition", "whats_news")),
-    getDoc(doc(db, "daily_edition", "hero_story")),
-    getDoc(doc(db, "daily_edition", "featured_stories")),
-    getDoc(doc(db, "daily_edition", "global_briefing")),
-    getDoc(doc(db, "daily_edition", "deep_dive")),
-    getDoc(doc(db, "daily_edition", "campus_news")),
-    getDoc(doc(db, "daily_edition", "opinions")),
-  ]);
+  // The whole edition is published atomically into one document, so one read is consistent
+  const editionSnap = await getDoc(doc(db, "system", "current_edition"));
+  const published = (editionSnap.exists() ? editionSnap.data()?.sections : null) || {};
+  const missing = Object.keys(LEGACY_DOCS).filter((key) => !published[key]);
+  const sections = missing.length ? { ...published, ...(await getLegacySections(missing)) } : published;
 
   return {
-    tickerData: tickerSnap.exists() ? tickerSnap.data()?.items : [],
-    newsData: newsSnap.exists() ? newsSnap.data() : { business: [], world: [] },
-    heroData: heroSnap.exists() ? heroSnap.data() : null,
-    featuredData: featuredSnap.exists() ? featuredSnap.data()?.items : [],
-    globalData: globalSnap.exists() ? globalSnap.data()?.items : [],
-    deepDiveData: deepDiveSnap.exists() ? deepDiveSnap.data() : null,
-    campusData: campusSnap.exists() ? campusSnap.data()?.items : [],
-    opinionsData: opinionsSnap.exists() ? opinionsSnap.data()?.items : [],
+    tickerData: sections?.ticker?.items || [],
+    newsData: sections?.whats_news || { business: [], world: [] },
+    heroData: sections?.hero || null,
+    featuredData: sections?.featured?.items || [],
+    globalData: sections?.global_briefing?.items || [],
+    deepDiveData: sections?.deep_dive || null,
+    campusData: sections?.campus?.items || [],
+    opinionsData: sections?.opinions?.items || [],
   };
 }
 
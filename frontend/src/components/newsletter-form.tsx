@@ -21,6 +21,7 @@ export function NewsletterForm() {
       const { db } = await import("@/lib/firebase");
       await addDoc(collection(db, "subscribers"), {
         email,
+        emailKey: email.trim().toLowerCase(),
         subscribedAt: serverTimestamp(),
       });
       setStatus("success");